@@ -3,6 +3,7 @@ from core.anomaly_detection import anomaly_detection_sementic
 from dbs.audio import get_audio_files
 from core.report import transcribe_audio_openai
 import json
+import asyncio
 from typing import List, Dict,Optional,Any
 from dbs.db_connections import get_db_connection
 router = APIRouter()
@@ -18,7 +19,7 @@ async def anomaly_detection_text(raw_text:str):
 async def anomaly_detection_audio_file(filename:str):
     files = get_audio_files()
     audio_path = files[filename]
-    result = transcribe_audio_openai(audio_path)
+    result = await asyncio.to_thread(transcribe_audio_openai, audio_path)
     transcribe_text = result["text"] 
     resp = await anomaly_detection_sementic(transcribe_text)
     return resp
@@ -4,7 +4,7 @@ from typing import Optional
 from fastapi import Form 
 import os
 from core.servicenow import get_servicenow_access_token, get_incident_sys_id
-from core.servicenow import ServiceNowPDFUploader
+from core.servicenow import get_servicenow_uploader
 router = APIRouter()
 
 @router.post("/submit-feedback-servicenow")
@@ -27,7 +27,7 @@ def submit_feedback_servicenow_endpoint(
        
 
         # Upload PDF to ServiceNow incident
-        uploader = ServiceNowPDFUploader(servicenow_instance_url, servicenow_access_token)
+        uploader = get_servicenow_uploader()
         upload_result = uploader.upload_feedback_file(sys_id,feedback,rate)
 
         return {"success": True, "incident_number": incident_number, "result": upload_result}
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Request
+from core.models import ProcessRequest, JobSubmitResponse, JobStatusResponse, JobResultsResponse
+from core.processing import resolve_process_request
+from core.jobs import submit_job, get_job
+
+router = APIRouter()
+
+
+@router.post("/jobs/process-calls", response_model=JobSubmitResponse, status_code=202)
+def submit_process_calls_job(req: ProcessRequest, request: Request):
+    """
+    Queues a /process-calls batch in the background and returns its job id immediately.
+    Poll /jobs/{job_id} for progress and /jobs/{job_id}/results for the per-file results.
+    """
+    audio_paths, _ = resolve_process_request(req)
+    job_id = submit_job(audio_paths, req.model_option, req.incremental, req.analysis_mode)
+    return JobSubmitResponse(
+        job_id=job_id,
+        status="queued",
+        status_url=str(request.url_for("get_job_status", job_id=job_id)),
+        results_url=str(request.url_for("get_job_results", job_id=job_id)),
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def get_job_status(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return JobStatusResponse(**job)
+
+
+@router.get("/jobs/{job_id}/results", response_model=JobResultsResponse)
+def get_job_results(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    errors = {name: f["error"] for name, f in job["files"].items() if f["status"] == "failed"}
+    return JobResultsResponse(job_id=job_id, status=job["status"], results=job["results"], errors=errors,
+                              incidents=job["incidents"])
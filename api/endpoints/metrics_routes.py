@@ -0,0 +1,49 @@
+from fastapi import APIRouter
+from core.report import transcription_cache
+from core.llm_cache import cache_stats as llm_cache_stats
+from core.audio_download import download_stats
+from core.state_store import call_state_store
+from core.llm_scheduler import llm_scheduler
+from core.anomaly_prescreen import prescreen_stats
+from core.servicenow import incident_cache
+
+router = APIRouter()
+
+
+@router.get("/metrics/caches")
+def cache_metrics():
+    """
+    Hit/miss, eviction and size counters of the caches of this worker.
+    """
+    return {
+        "transcription": transcription_cache.stats(),
+        "llm_responses": llm_cache_stats(),
+        "call_states": call_state_store.stats(),
+        "servicenow_incidents": incident_cache.stats(),
+    }
+
+
+@router.get("/metrics/audio-downloads")
+def audio_download_metrics():
+    """
+    Audio download counters: in-flight downloads, bytes held in memory (current and peak) and spills to disk.
+    """
+    return download_stats()
+
+
+
+@router.get("/metrics/llm-scheduler")
+def llm_scheduler_metrics():
+    """
+    Per-deployment LLM/Whisper scheduler state: queue depth, in-flight requests, adaptive concurrency
+    limit, 429 throttle events and retries, and reserved vs reported token usage.
+    """
+    return llm_scheduler.stats()
+
+
+@router.get("/metrics/anomaly-prescreen")
+def anomaly_prescreen_metrics():
+    """
+    Texts screened locally for PII/fraud cues, and how many of them were escalated to the LLM.
+    """
+    return prescreen_stats()
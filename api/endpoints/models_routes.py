@@ -1,9 +1,10 @@
 from fastapi import APIRouter
 from typing import List
+from core.report import MODEL_OPTIONS
 
 
 router = APIRouter()
 
 @router.get("/models", response_model=List[str])
 def list_models():
-    return ["AzureOpenAI", "ChatGroq"]
\ No newline at end of file
+    return MODEL_OPTIONS
\ No newline at end of file
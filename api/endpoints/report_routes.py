@@ -5,36 +5,38 @@ from fastapi.responses import StreamingResponse
 from fastapi.responses import JSONResponse
 import plotly.graph_objs as go
 from core.report import extract_inc_number, generate_pdf_report
-from core.blob import upload_pdf_to_blob
-from core.servicenow import ServiceNowPDFUploader
-from typing import Dict, List
+from core.servicenow import get_servicenow_uploader
+from core.report_outbox import enqueue_report_upload, get_report_upload
+from core.report_export import iter_report_zip
+from dbs.statistics import get_audio_filenames_by_date
+import asyncio
 import os
-import tempfile
-from core.models import BatchProcessResponse, ProcessRequest,CallOutItem,FileProcessResponse
-from core.report import process_email_notifications, create_pipeline, load_llm
-from core.anomaly_detection import anomaly_detection_sementic
-from dbs.statistics import insert_statistics
+from core.models import BatchProcessResponse, ProcessRequest,ReportExportRequest
+from core.processing import process_call_files, stream_call_files, resolve_process_request
+import json
+from core.state_store import call_state_store
 
 router = APIRouter()
 
-processed_calls: Dict[str, List[dict]] = {}
-
 
 @router.get("/check-incidient-number-from-audio")
 def check_incident_number(filename: str = Query(..., description="The filename of the processed audio file")):
-    if not filename or filename not in processed_calls:
+    state = call_state_store.get(filename) if filename else None
+    if not state:
         raise HTTPException(status_code=404, detail="No processed call available. Run /process-call first.")
 
     files = get_audio_files()
     audio_path = files[filename]
-    state = processed_calls[filename]
     inc_number = extract_inc_number(state)
-    servicenow_instance_url = os.getenv("SERVICENOW_INSTANCE_URL")
-    servicenow_access_token = get_servicenow_access_token()
     if not inc_number:
         return {"incident_number": None, "valid": None}
     else:
-        sys_id = get_incident_sys_id(servicenow_instance_url, servicenow_access_token, inc_number)
+        # Resolved with the rest of its batch when the call was processed
+        sys_id = (state.get("incident_sys_ids") or {}).get(inc_number)
+        if not sys_id:
+            servicenow_instance_url = os.getenv("SERVICENOW_INSTANCE_URL")
+            servicenow_access_token = get_servicenow_access_token()
+            sys_id = get_incident_sys_id(servicenow_instance_url, servicenow_access_token, inc_number)
         if not sys_id:
             return {"incident_number": inc_number, "valid": False}
         else:
@@ -60,68 +62,73 @@ def download_report(filename: str = Query(..., description="The filename of the
                     incident_number: str = Query(None, description="Optional incident number. If not provided, it will be extracted.")
                     ):
 
-    if not filename or filename not in processed_calls:
+    state = call_state_store.get(filename) if filename else None
+    if not state:
         raise HTTPException(status_code=404, detail="No processed call available. Run /process-call first.")
 
-    files = get_audio_files()
-    audio_path = files[filename]
-    state = processed_calls[filename]
     if incident_number:
         inc_number = incident_number
     else:
         inc_number = extract_inc_number(state)
         
     pdf_buffer = generate_pdf_report(filename,state)
-    
-    if not inc_number:
-        print("No INC found, uploading to Azure Blob Storage...")
-        blob_url = upload_pdf_to_blob(pdf_buffer, f"Call_Summary_{filename}.pdf", prefix="no-inc")
-        upload_result = {"uploaded_to": "azure_blob", "blob_url": blob_url}
-    else:
-        
-        servicenow_instance_url = os.getenv("SERVICENOW_INSTANCE_URL")
-        servicenow_access_token = get_servicenow_access_token()
-        upload_result = None
-
-        if servicenow_instance_url and servicenow_access_token:
-            try:
-                uploader = ServiceNowPDFUploader(servicenow_instance_url, servicenow_access_token)
- 
-                sys_id = get_incident_sys_id(servicenow_instance_url, servicenow_access_token, inc_number)
-                if not sys_id:
-                        print(f"Incident {inc_number} not found. Uploading to Azure Blob Storage...")
-                        blob_url = upload_pdf_to_blob(pdf_buffer, f"Call_Summary_{filename}.pdf", prefix="incident-not-found")
-                        upload_result = {"uploaded_to": "azure_blob", "blob_url": blob_url}
-
-                else:
-                    # Upload to ServiceNow
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-                        tmp_pdf.write(pdf_buffer.getvalue())
-                        tmp_pdf_path = tmp_pdf.name
-                    upload_result = uploader.upload_pdf_to_incident(
-                        sys_id,
-                        tmp_pdf_path,
-                        custom_filename=f"Call_Summary_{filename}.pdf"
-                    )
-                    os.remove(tmp_pdf_path)
-
-            except Exception as e:
-                upload_result = {"error": str(e)}
-        else:
-            print("Missing ServiceNow config. Uploading to Azure Blob Storage...")
-            blob_url = upload_pdf_to_blob(pdf_buffer, f"Call_Summary_{filename}.pdf", prefix="no-servicenow")
-            upload_result = {"uploaded_to": "azure_blob", "blob_url": blob_url}
+
+    # The ServiceNow/Blob upload is queued in the outbox and delivered in the background;
+    # its outcome is available from /report-uploads/{upload_id}
+    sys_id = (state.get("incident_sys_ids") or {}).get(inc_number) if inc_number else None
+    upload_id = enqueue_report_upload(filename, pdf_buffer.getvalue(), inc_number, sys_id)
 
     response = StreamingResponse(
         pdf_buffer,
         media_type="application/pdf",
         headers={
             "Content-Disposition": f"attachment; filename=Call_Summary_{filename}.pdf",
-            "X-ServiceNow-Upload-Result": str(upload_result)[:2000]  # Truncate for header safety
+            "X-Report-Upload-Id": upload_id,
+            "Access-Control-Expose-Headers": "X-Report-Upload-Id",
         }
     )
     return response
 
+async def read_upload_chunks(file: UploadFile, chunk_size: int = 64 * 1024):
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+@router.post("/download-reports")
+def download_reports(req: ReportExportRequest):
+    """
+    Bulk report export: a ZIP with the PDF report of every listed call (or of every call recorded
+    between start_datetime and end_datetime), streamed while the reports are rendered.
+    Calls that could not be exported are listed in errors.json inside the archive.
+    """
+    if req.filenames:
+        filenames = req.filenames
+    elif req.start_datetime and req.end_datetime:
+        filenames = get_audio_filenames_by_date(req.start_datetime, req.end_datetime)
+    else:
+        raise HTTPException(status_code=400, detail="Provide filenames or both start_datetime and end_datetime.")
+    if not filenames:
+        raise HTTPException(status_code=404, detail="No calls found for the requested export.")
+
+    return StreamingResponse(
+        iter_report_zip(filenames),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=Call_Summaries.zip"}
+    )
+
+
+@router.get("/report-uploads/{upload_id}")
+def get_report_upload_status(upload_id: str):
+    """
+    Status of a report upload queued by /download-report (id from its X-Report-Upload-Id header):
+    queued, uploading, completed (with the ServiceNow/Blob result) or failed (after all retries).
+    """
+    upload = get_report_upload(upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail=f"Report upload not found: {upload_id}")
+    return upload
+
+
 @router.post("/upload-report-to-incident")
 async def upload_report_to_incident(
     incident_number: str = Form(..., description="ServiceNow incident number"),
@@ -129,34 +136,24 @@ async def upload_report_to_incident(
 ):
     # Check ServiceNow configuration
     servicenow_instance_url = os.getenv("SERVICENOW_INSTANCE_URL")
-    servicenow_access_token = get_servicenow_access_token()
+    servicenow_access_token = await asyncio.to_thread(get_servicenow_access_token)
 
     if not servicenow_instance_url or not servicenow_access_token: 
         return {"success": False, "incident_number": incident_number, "result": "Missing ServiceNow configuration"}
 
     try:
         # Check if incident exists
-        sys_id = get_incident_sys_id(servicenow_instance_url, servicenow_access_token, incident_number)
+        sys_id = await asyncio.to_thread(get_incident_sys_id, servicenow_instance_url, servicenow_access_token, incident_number)
         if not sys_id: 
             return {"success": False, "incident_number": incident_number, "result": "Incident {incident_number} not found"}
 
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-            contents = await file.read()
-            tmp_pdf.write(contents)
-            tmp_pdf_path = tmp_pdf.name
-
-        # Upload PDF to ServiceNow incident
-        uploader = ServiceNowPDFUploader(servicenow_instance_url, servicenow_access_token)
-        upload_result = uploader.upload_pdf_to_incident(
+        # Stream the uploaded file to the ServiceNow incident chunk by chunk
+        upload_result = await get_servicenow_uploader().aupload_pdf_to_incident(
             sys_id,
-            tmp_pdf_path,
+            read_upload_chunks(file),
             custom_filename = f"Incident_{incident_number}_{file.filename or 'report.pdf'}"
         )
 
-        # Cleanup
-        os.remove(tmp_pdf_path)
-
         return {"success": True, "incident_number": incident_number, "result": upload_result}
 
     except Exception as e:
@@ -164,9 +161,9 @@ async def upload_report_to_incident(
 
 @router.get("/sentiment-graph-interactive")
 def sentiment_graph_interactive(filename: str = Query(..., description="The filename of the processed audio file")):
-    if not filename or filename not in processed_calls:
+    state = call_state_store.get(filename) if filename else None
+    if not state:
         raise HTTPException(status_code=404, detail="No processed call available. Run /process-call first.")
-    state = processed_calls[filename]
     chunks = state.get("sentiment_chunks", [])
     if not chunks:
         raise HTTPException(status_code=204, detail="No sentiment chunks available")
@@ -199,70 +196,34 @@ def sentiment_graph_interactive(filename: str = Query(..., description="The file
 
 @router.post("/process-calls", response_model=BatchProcessResponse)
 async def process_calls(req: ProcessRequest, request: Request):
-    files = get_audio_files()
-    results = {}
-
-
-    for filename in req.filenames:
-        if filename not in files:
-            raise HTTPException(status_code=404, detail=f"Audio file not found: {filename}")
-
-
-        audio_path = files[filename]
-        try:
-            llm = load_llm(req.model_option)
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-
-
-        pipeline = create_pipeline(llm)
-        state = pipeline.invoke({"audio_path": audio_path})
-
-
-        # Convert call_outs to proper Pydantic models
-        call_out_items = [
-            CallOutItem(
-                time_sec=item["time_sec"],
-                label=item["label"],
-                description=item["description"]
-            )
-            for item in state.get("call_outs", [])
-        ]
-
-
-        processed_calls[filename] = state
-        incident_number = extract_inc_number(state)
-        emails = process_email_notifications(state)
-
-        #Anomal Detection
-        transcribed_text = state.get("transcription", "")
-        anomaly_result = await anomaly_detection_sementic(transcribed_text)
-
-        #statics
-        insert_statistics(
-            filename,
-            state.get("audio_duration"),
-            state.get("Agent_rating"),
-            state.get("sentiment_score"),
-            anomaly_result.get("isAnomaly"),
-            anomaly_result.get("reasons")
-        )
-        results[filename] = FileProcessResponse(
-            call_summary=state["call_summary"],
-            sentiment=state["sentiment"],
-            sentiment_score=state["sentiment_score"],
-            call_purpose=state["call_purpose"],
-            speaker_insights=state.get("speaker_insights"),
-            Agent_rating=state.get("Agent_rating"),
-            action_items=state.get("action_items"),
-            email_sent=emails,
-            sentiment_chunks=state.get("sentiment_chunks"),
-            Customer_name=state.get("Customer_name"),
-            Agent_name=state.get("Agent_name"),
-            call_outs=call_out_items,
-            anomaly_detection=anomaly_result,
-            inc_number=incident_number
-        )
-
-
-    return BatchProcessResponse(results=results)
\ No newline at end of file
+    audio_paths, concurrency = resolve_process_request(req)
+    results, errors, incidents = await process_call_files(audio_paths, req.model_option, concurrency, req.incremental,
+                                                          req.analysis_mode)
+
+    return BatchProcessResponse(results=results, errors=errors, incidents=incidents)
+
+
+@router.post("/process-calls/stream")
+async def process_calls_stream(req: ProcessRequest, format: str = Query("sse", pattern="^(sse|ndjson)$",
+                                                                         description="sse (text/event-stream) or ndjson")):
+    """
+    Same processing as /process-calls, streamed as events while each stage of each file finishes:
+    started, transcription_ready, sentiment_chunks_ready, summary_ready, call_outs_ready,
+    anomaly_result, emails_sent, then file_result (or file_error) per file, and incidents_resolved
+    and done at the end.
+    In the combined analysis mode a single analysis_ready event replaces the four stage events.
+    """
+    audio_paths, concurrency = resolve_process_request(req)
+
+    async def events():
+        async for event in stream_call_files(audio_paths, req.model_option, concurrency, req.incremental,
+                                             req.analysis_mode):
+            payload = json.dumps(event, default=str)
+            if format == "sse":
+                yield f"event: {event['event']}\ndata: {payload}\n\n"
+            else:
+                yield payload + "\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -6,6 +6,7 @@ from starlette.websockets import WebSocketState
 from core.transcribe import auto_correct_text
 import json
 from core.anomaly_detection import anomaly_detection_sementic
+from core.anomaly_prescreen import prescreen_anomalies
 router = APIRouter()
 
 SPEECH_KEY = os.getenv("SPEECH_KEY")
@@ -17,6 +18,7 @@ async def websocket_transcribe(ws: WebSocket):
     config_msg = await ws.receive_json()
     enable_auto_correct = config_msg.get("auto_correct", True)
     enable_anomaly = config_msg.get("anomaly", True)
+    deep_review = config_msg.get("deep_review", False) # send every utterance to the LLM, not only suspicious ones
     
     speech_config = speechsdk.SpeechConfig(subscription=SPEECH_KEY, endpoint=SPEECH_ENDPOINT)
     speech_config.speech_recognition_language = "en-US"
@@ -59,7 +61,7 @@ async def websocket_transcribe(ws: WebSocket):
             )
             if enable_auto_correct or enable_anomaly:
                 asyncio.run_coroutine_threadsafe(
-                    handle_backend_processing(ws, text, enable_auto_correct, enable_anomaly),
+                    handle_backend_processing(ws, text, enable_auto_correct, enable_anomaly, deep_review),
                     loop
                 )
 
@@ -100,6 +102,12 @@ def ws_transcribe_doc():
     - Receive JSON messages:  
         - `{"type": "transcribing", "text": "..."}`  
         - `{"type": "transcribed", "text": "..."}`  
+        - `{"type": "anomaly", "provisional": true|false, "isAnomaly": ..., "anomalyCount": ..., "reasons": [...]}`  
+
+    **Config message** (first message): `{"auto_correct": true, "anomaly": true, "deep_review": false}`.
+    Every final utterance gets a provisional anomaly result from the local pre-screen; only suspicious
+    utterances (or all of them with `deep_review`) are then reviewed by the LLM, whose result follows
+    with `"provisional": false`.
     """
     return {"message": "This endpoint is only for documentation; use WebSocket at /ws/transcribe."}
 
@@ -110,11 +118,16 @@ async def auto_correct_endpoint(raw_text:str):
     corrected = await auto_correct_text(raw_text)
     return {"corrected_text": corrected}
 
-async def handle_backend_processing(ws: WebSocket, text: str, auto_correct: bool, anomaly: bool):
+async def handle_backend_processing(ws: WebSocket, text: str, auto_correct: bool, anomaly: bool, deep_review: bool = False):
     if auto_correct:
         corrected = await auto_correct_text(text)
         await ws.send_text(json.dumps({"type": "auto_corrected", "text": corrected}))
 
     if anomaly:
-        anomaly_result = await anomaly_detection_sementic(text)
-        await ws.send_text(json.dumps({"type": "anomaly", **anomaly_result}))
\ No newline at end of file
+        provisional = prescreen_anomalies(text)
+        suspicious = provisional.pop("suspicious")
+        if not deep_review:
+            await ws.send_text(json.dumps({"type": "anomaly", "provisional": True, **provisional}))
+        if suspicious or deep_review:
+            anomaly_result = await anomaly_detection_sementic(text)
+            await ws.send_text(json.dumps({"type": "anomaly", "provisional": False, **anomaly_result}))
\ No newline at end of file
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from api.endpoints import  auth_routes, feedback_link_routes, users_routes, audio_routes ,models_routes, report_routes, feedback_email_routes, transcribe_routes, anomaly_routes, statistics_routes, feedback_servicenow_routes
+from api.endpoints import  auth_routes, feedback_link_routes, users_routes, audio_routes ,models_routes, report_routes, feedback_email_routes, transcribe_routes, anomaly_routes, statistics_routes, feedback_servicenow_routes, job_routes, metrics_routes
 
 api_router = APIRouter() 
 api_router.include_router(auth_routes.router, tags=["Auth"]) 
@@ -10,6 +10,8 @@ api_router.include_router(feedback_email_routes.router, tags=["Feedback with Ema
 api_router.include_router(feedback_servicenow_routes.router, tags=["Feedback to servicenow"])
 api_router.include_router(models_routes.router, tags=["Model"])
 api_router.include_router(report_routes.router, tags=["Report"])
+api_router.include_router(job_routes.router, tags=["Jobs"])
 api_router.include_router(transcribe_routes.router, tags=["Transcribe"])
 api_router.include_router(anomaly_routes.router, tags=["Anomaly Detection"])
-api_router.include_router(statistics_routes.router, tags=["Statistics Routes"])
\ No newline at end of file
+api_router.include_router(statistics_routes.router, tags=["Statistics Routes"])
+api_router.include_router(metrics_routes.router, tags=["Metrics"])
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Benchmark: default (one LLM request per stage) vs combined (single structured request) analysis.
+
+Runs the pipeline of each analysis mode on the same recordings and reports wall time,
+LLM requests and tokens per call. The LLM response cache is switched off so every run
+really calls the model; the transcription is made once up front and served from the
+transcription cache, so only the analysis stages are compared.
+
+Usage (from the repo root, with the app's .env available):
+    python -m benchmarks.analysis_modes --files call1.mp3 call2.mp3 --repeat 2
+"""
+import argparse
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+os.environ["LLM_CACHE_BACKEND"] = "off"
+
+from core.llm_scheduler import llm_scheduler
+from core.report import ANALYSIS_MODES, WHISPER_DEPLOYMENT, get_pipeline, transcribe_audio_openai
+from dbs.audio import get_audio_files
+
+
+def llm_totals() -> dict:
+    """Requests and reported tokens of every LLM deployment so far (Whisper excluded)."""
+    stats = [s for name, s in llm_scheduler.stats().items() if name != WHISPER_DEPLOYMENT]
+    return {
+        "requests": sum(s["requests"] for s in stats),
+        "tokens": sum(s["tokens_used"] for s in stats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", nargs="+", required=True, help="Filenames from the audio_files table")
+    parser.add_argument("--model-option", default="AzureOpenAI")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    files = get_audio_files()
+    audio_paths = [files[name] for name in args.files]
+    for audio_path in audio_paths:
+        transcribe_audio_openai(audio_path)  # warm the transcription cache
+
+    runs = len(audio_paths) * args.repeat
+    print(f"{'mode':<10} {'s/call':>8} {'requests/call':>14} {'tokens/call':>12}")
+    for analysis_mode in ANALYSIS_MODES:
+        pipeline = get_pipeline(args.model_option, analysis_mode)
+        before = llm_totals()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for audio_path in audio_paths:
+                pipeline.invoke({"audio_path": audio_path})
+        elapsed = time.perf_counter() - start
+        after = llm_totals()
+        print(f"{analysis_mode:<10} {elapsed / runs:8.2f} {(after['requests'] - before['requests']) / runs:14.1f} "
+              f"{(after['tokens'] - before['tokens']) / runs:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Event-loop responsiveness under LLM load.
+
+Fires --concurrency anomaly_detection_sementic / auto_correct_text calls at once (with the
+LLM cache off, so every call reaches Azure OpenAI) while a ticker coroutine measures how late
+the loop wakes it up. With the async client layer the worst lag should stay in the
+milliseconds even though each LLM call takes seconds; a blocking call would show up as a lag
+about as long as the call itself.
+
+Usage (from the repo root, with the app's .env available):
+    python -m benchmarks.loop_responsiveness --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+os.environ["LLM_CACHE_BACKEND"] = "off"
+
+from core.anomaly_detection import anomaly_detection_sementic
+from core.transcribe import auto_correct_text
+
+TICK_SECONDS = 0.01
+
+
+async def ticker(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+
+async def run(concurrency: int):
+    stop, lags = asyncio.Event(), []
+    tick = asyncio.create_task(ticker(stop, lags))
+    text = "Hi, this is the billing team, can you confirm the card number on file so we can process the refund? "
+
+    started = time.perf_counter()
+    calls = []
+    for i in range(concurrency):
+        unique = f"{text}(call {uuid.uuid4().hex[:6]})"
+        calls.append(anomaly_detection_sementic(unique) if i % 2 == 0 else auto_correct_text(unique))
+    await asyncio.gather(*calls)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await tick
+    lags.sort()
+    print(f"{concurrency} LLM calls finished in {elapsed:.2f}s")
+    print(f"loop lag: median {lags[len(lags) // 2] * 1000:.1f} ms, p99 {lags[int(len(lags) * 0.99)] * 1000:.1f} ms, "
+          f"max {lags[-1] * 1000:.1f} ms over {len(lags)} ticks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Micro-benchmark: per-request overhead of building the pipeline.
+
+Compares recompiling the StateGraph for every file (old create_pipeline per file)
+with fetching the compiled pipeline from the registry (get_pipeline).
+No LLM or Whisper call is made - only graph construction/lookup is timed.
+
+Usage (from the repo root, with the app's .env available):
+    python -m benchmarks.pipeline_registry --iterations 200
+"""
+import argparse
+import time
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+from core.report import create_pipeline, get_pipeline, load_llm
+
+
+def time_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--model-option", default="AzureOpenAI")
+    args = parser.parse_args()
+
+    llm = load_llm(args.model_option)
+    get_pipeline(args.model_option)  # first use compiles once
+
+    compile_ms = time_per_call(lambda: create_pipeline(llm), args.iterations)
+    registry_ms = time_per_call(lambda: get_pipeline(args.model_option), args.iterations)
+
+    print(f"create_pipeline per file : {compile_ms:8.3f} ms")
+    print(f"get_pipeline (registry)  : {registry_ms:8.3f} ms")
+    print(f"saved per file           : {compile_ms - registry_ms:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Offline bulk processing of the recordings listed in the audio_files table.
+
+Runs the same chain as /process-calls (pipeline, insert_statistics) in a thread or
+process pool. Notification emails are not sent for these historical calls unless
+--send-emails is given. Every finished file is appended to a checkpoint file, so an
+interrupted run picks up where it stopped when started again with the same checkpoint.
+
+Usage:
+    python bulk_process.py --model-option AzureOpenAI --workers 8
+    python bulk_process.py --executor process --workers 4 --checkpoint runs/nightly.jsonl
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+from core.processing import process_call_file
+from dbs.audio import get_audio_files
+
+
+def load_checkpoint(path: str) -> set:
+    """Filenames already completed in a previous run."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partial line from an interrupted write
+            if entry.get("status") == "completed":
+                done.add(entry["filename"])
+    return done
+
+
+def process_one(filename: str, audio_path: str, model_option: str, incremental: bool, analysis_mode: str,
+                send_emails: bool = False) -> dict:
+    state, response = process_call_file(filename, audio_path, model_option, incremental=incremental,
+                                        analysis_mode=analysis_mode, send_emails=send_emails)
+    return {"audio_duration": state.get("audio_duration") or 0, "skipped": response.from_previous_run}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-option", default="AzureOpenAI")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--checkpoint", default=os.path.join(".cache", "bulk_checkpoint.jsonl"))
+    parser.add_argument("--files", nargs="*", help="Only process these filenames")
+    parser.add_argument("--limit", type=int, help="Process at most this many pending files")
+    parser.add_argument("--analysis-mode", choices=["default", "combined"], default="default",
+                        help="combined: one structured LLM request per call instead of one per stage")
+    parser.add_argument("--send-emails", action="store_true",
+                        help="Send the attention/action-item notification emails like /process-calls does")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Skip recordings unchanged since their last analysis (same content, model and pipeline version)")
+    args = parser.parse_args()
+
+    files = get_audio_files()
+    if args.files:
+        files = {name: files[name] for name in args.files if name in files}
+
+    done = load_checkpoint(args.checkpoint)
+    pending = [name for name in files if name not in done]
+    if args.limit:
+        pending = pending[:args.limit]
+    print(f"{len(files)} files listed, {len(done)} already done, {len(pending)} to process")
+    if not pending:
+        return
+
+    os.makedirs(os.path.dirname(args.checkpoint) or ".", exist_ok=True)
+    completed, failed, skipped, audio_seconds = 0, 0, 0, 0
+    started = time.monotonic()
+
+    executor_cls = ProcessPoolExecutor if args.executor == "process" else ThreadPoolExecutor
+    with open(args.checkpoint, "a", encoding="utf-8") as checkpoint, executor_cls(max_workers=args.workers) as executor:
+        futures = {executor.submit(process_one, name, files[name], args.model_option, args.incremental,
+                                   args.analysis_mode, args.send_emails): name for name in pending}
+        try:
+            for future in as_completed(futures):
+                filename = futures[future]
+                entry = {"filename": filename, "finished_at": datetime.utcnow().isoformat()}
+                try:
+                    result = future.result()
+                    entry.update(status="completed", audio_duration=result["audio_duration"], skipped=result["skipped"])
+                    completed += 1
+                    if result["skipped"]:
+                        skipped += 1
+                    else:
+                        audio_seconds += result["audio_duration"]
+                except Exception as e:
+                    entry.update(status="failed", error=str(e))
+                    failed += 1
+                    print(f"✗ {filename}: {e}")
+                checkpoint.write(json.dumps(entry) + "\n")
+                checkpoint.flush()
+                print(f"[{completed + failed}/{len(pending)}] {entry['status']}: {filename}")
+        except KeyboardInterrupt:
+            print("Interrupted - finished files are checkpointed, rerun to resume.")
+            for future in futures:
+                future.cancel()
+            raise
+
+    minutes = (time.monotonic() - started) / 60
+    print(f"\nCompleted {completed} ({skipped} unchanged, reused), failed {failed} in {minutes:.1f} min")
+    if minutes > 0:
+        print(f"Throughput: {completed / minutes:.2f} files/min, {audio_seconds / 60 / minutes:.2f} audio-minutes/min")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
  
-from openai import AzureOpenAI
 import json
 import os
 from pydantic import BaseModel
-from dotenv import load_dotenv
+from core.llm import deployment, get_openai_client, get_async_openai_client
+from core.llm_scheduler import llm_scheduler, estimate_tokens, completion_tokens
+from core.llm_cache import cached_call, acached_call
+from core.anomaly_prescreen import prescreen_anomalies
+
+ANOMALY_PROMPT_VERSION = "anomaly-v1"
+ANOMALY_MODEL = deployment # the chat deployment, so its calls share the chat client's rate limits
+# Batch pipeline: "true" sends every transcript to the LLM, "false" only those the local pre-screen flags
+ANOMALY_DEEP_REVIEW = os.getenv("ANOMALY_DEEP_REVIEW", "true").lower() == "true"
 
 class AnomalyEvent(BaseModel):
     isAnomaly: bool
@@ -11,18 +18,7 @@ class AnomalyEvent(BaseModel):
     reasons: list[str]
  
 
-async def anomaly_detection_sementic(text: str) -> dict:
-    """
-    Call Azure OpenAI for anomaly detection in transcripts.
-    Returns JSON with anomaly flag, count, and reasons.
-    """
-    
-    client = AzureOpenAI(
-        azure_endpoint =  os.getenv("AZURE_OPENAI_ENDPOINT") ,
-        api_key=os.getenv("AZURE_OPENAI_KEY"),  
-        api_version="2025-01-01-preview"
-        )
-    
+def get_anomaly_messages(text: str) -> list:
     system_prompt = """
     You are a strict JSON classifier. Given a call transcript, decide if it indicates one or more anomalies (possible fraud).
     "Anomaly" includes:
@@ -55,19 +51,15 @@ async def anomaly_detection_sementic(text: str) -> dict:
 
     user_prompt = f"Transcript: {text} Return JSON only."
 
-    completion = client.beta.chat.completions.parse(
-    model="gpt-4o",  
-    messages=[
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
-    ],
-    response_format=AnomalyEvent,
-    )
+    ]
 
-    response = completion.choices[0].message
 
+def parse_anomaly_response(content: str) -> dict:
     try:
-        parsed = json.loads(response.content)
+        parsed = json.loads(content)
 
         # Normalize reasons: if it's a single string, convert to list
         if isinstance(parsed.get("reasons"), str):
@@ -78,4 +70,57 @@ async def anomaly_detection_sementic(text: str) -> dict:
 
         return parsed
     except Exception:
-        return {"isAnomaly": False, "anomalyCount": 0, "reasons": []}
\ No newline at end of file
+        return {"isAnomaly": False, "anomalyCount": 0, "reasons": []}
+
+
+async def anomaly_detection_sementic(text: str, deep_review: bool = True) -> dict:
+    """
+    Call Azure OpenAI for anomaly detection in transcripts, without blocking the event loop.
+    Returns JSON with anomaly flag, count, and reasons.
+    Without `deep_review`, the text goes through the local pre-screen first and only reaches
+    the LLM when the pre-screen finds something suspicious.
+    """
+    if not deep_review:
+        provisional = prescreen_anomalies(text)
+        if not provisional.pop("suspicious"):
+            return provisional
+
+    client = get_async_openai_client()
+    messages = get_anomaly_messages(text)
+    rendered = json.dumps(messages)
+
+    async def call() -> str:
+        completion = await llm_scheduler.arun(ANOMALY_MODEL, estimate_tokens(rendered), lambda: client.beta.chat.completions.parse(
+            model=ANOMALY_MODEL,
+            messages=messages,
+            response_format=AnomalyEvent,
+        ), completion_tokens)
+        return completion.choices[0].message.content
+
+    content = await acached_call(ANOMALY_MODEL, ANOMALY_PROMPT_VERSION, rendered, call)
+    return parse_anomaly_response(content)
+
+
+def detect_anomalies(text: str, deep_review: bool = True) -> dict:
+    """
+    Blocking variant of anomaly_detection_sementic, for pipeline nodes running in worker threads.
+    """
+    if not deep_review:
+        provisional = prescreen_anomalies(text)
+        if not provisional.pop("suspicious"):
+            return provisional
+
+    client = get_openai_client()
+    messages = get_anomaly_messages(text)
+    rendered = json.dumps(messages)
+
+    def call() -> str:
+        completion = llm_scheduler.run(ANOMALY_MODEL, estimate_tokens(rendered), lambda: client.beta.chat.completions.parse(
+            model=ANOMALY_MODEL,
+            messages=messages,
+            response_format=AnomalyEvent,
+        ), completion_tokens)
+        return completion.choices[0].message.content
+
+    content = cached_call(ANOMALY_MODEL, ANOMALY_PROMPT_VERSION, rendered, call)
+    return parse_anomaly_response(content)
@@ -0,0 +1,83 @@
+import re
+import threading
+
+# Bump whenever a pattern changes, so stored results are not reused by incremental runs
+PRESCREEN_VERSION = "prescreen-v3"
+
+# One alternation, one pass over the text; the group that matched names the finding.
+# Disclosures come before the bare mentions they start with, so the longer match wins.
+_PATTERNS = {
+    "ssn": r"\b\d{3}[- ]\d{2}[- ]\d{4}\b",
+    "card": r"\b(?:\d[ -]?){12,18}\d\b",
+    "secret_code": r"\b(?:cvv|cvc|security\s+code|pin(?:\s+(?:number|code))?|one[- ]time\s+(?:password|code|pin)"
+                   r"|otp|verification\s+code|2fa|two[- ]factor(?:\s+code)?|(?:code|passcode)\s+(?:is|was))\b"
+                   r"[^\d.?!]{0,20}?\d(?:[ -]?\d){2,7}\b",
+    "ssn_mention": r"\bsocial\s+security(?:\s+number)?\b|\bssn\b",
+    "secret_code_mention": r"\b(?:cvv|cvc|security\s+code|one[- ]time\s+(?:password|code|pin)|otp|verification\s+code"
+                           r"|2fa|two[- ]factor(?:\s+code)?)\b",
+    "card_mention": r"\b(?:(?:credit|debit)\s+card|card\s+(?:number|details)"
+                    r"|(?:digits|numbers?)\s+on\s+(?:the\s+back\s+of\s+)?(?:your|the)\s+(?:(?:credit|debit)\s+)?card"
+                    r"|expir(?:ation|y)(?:\s+date)?|date\s+of\s+birth|dob|last\s+(?:four|4)(?:\s+digits)?)\b",
+    "credentials": r"\b(?:password|passcode|routing\s+number|account\s+number|bank\s+account|mother'?s\s+maiden\s+name"
+                   r"|security\s+question|driver'?s\s+licen[cs]e|passport\s+number|login\s+details)\b",
+    "scam": r"\b(?:gift\s+cards?|wire\s+(?:the\s+)?(?:money|transfer)|bitcoin|crypto(?:currency)?|irs|arrest\s+warrant"
+            r"|remote\s+access|anydesk|teamviewer|refund\s+department|tech(?:nical)?\s+support\s+team|lottery|prize)\b",
+    "pressure": r"\b(?:act\s+fast|last\s+chance|don'?t\s+tell|keep\s+this\s+between"
+                r"|account\s+will\s+be\s+(?:closed|suspended|locked)|legal\s+action)\b",
+}
+_MATCHER = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in _PATTERNS.items()), re.IGNORECASE)
+
+# Findings that are anomalies on their own: sensitive numbers actually spoken in the call
+STRONG_FINDINGS = {
+    "ssn": "Social security number disclosed",
+    "card": "Card number disclosed",
+    "secret_code": "CVV/PIN/OTP disclosed",
+}
+# Cues that are common in legitimate calls too: they only make the text worth an LLM review
+WEAK_FINDINGS = {"ssn_mention", "secret_code_mention", "card_mention", "credentials", "scam", "pressure"}
+
+_stats_lock = threading.Lock()
+_stats = {"screened": 0, "suspicious": 0, "anomalies": 0}
+
+
+def luhn_valid(digits: str) -> bool:
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        d = int(ch)
+        if i % 2 == 1:
+            d = d * 2 - 9 if d > 4 else d * 2
+        total += d
+    return total % 10 == 0
+
+
+def prescreen_anomalies(text: str) -> dict:
+    """
+    Local PII/fraud screen of a transcript in a single regex pass.
+    Returns a provisional result in the anomaly detection format - an anomaly only for strong findings
+    (SSN, Luhn-valid card number, disclosed CVV/PIN/OTP) - plus "suspicious", set by any finding,
+    strong or weak, which tells whether the text deserves an LLM review.
+    """
+    found = []
+    for match in _MATCHER.finditer(text or ""):
+        kind = match.lastgroup
+        if kind == "card" and not luhn_valid(re.sub(r"\D", "", match.group())):
+            continue
+        if kind not in found:
+            found.append(kind)
+
+    reasons = [STRONG_FINDINGS[kind] for kind in found if kind in STRONG_FINDINGS]
+    with _stats_lock:
+        _stats["screened"] += 1
+        if found:
+            _stats["suspicious"] += 1
+        if reasons:
+            _stats["anomalies"] += 1
+
+    return {"isAnomaly": bool(reasons), "anomalyCount": len(reasons), "reasons": reasons, "suspicious": bool(found)}
+
+
+def prescreen_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["llm_review_rate"] = stats["suspicious"] / stats["screened"] if stats["screened"] else None
+    return stats
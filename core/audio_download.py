@@ -0,0 +1,115 @@
+import os
+import struct
+import tempfile
+import threading
+from mutagen import File
+
+# Audio kept in memory per in-flight download before spilling to a temp file on disk
+AUDIO_SPOOL_MAX_MEMORY_MB = float(os.getenv("AUDIO_SPOOL_MAX_MEMORY_MB", "8"))
+# Size of every blob range request (first one included) - the audio buffered per download on top of the spool.
+# The blob client must be created with max_single_get_size/max_chunk_get_size set to this (see blob_client_options)
+AUDIO_DOWNLOAD_CHUNK_BYTES = 4 * 1024 * 1024
+AUDIO_HEADER_PROBE_BYTES = 64 * 1024
+
+_stats_lock = threading.Lock()
+_stats = {
+    "downloads": 0,
+    "in_flight": 0,
+    "spilled_to_disk": 0,
+    "in_memory_bytes": 0,       # audio bytes currently held in RAM by in-flight downloads (spools and chunks)
+    "peak_in_memory_bytes": 0,
+    "bytes_downloaded": 0,
+}
+
+
+def blob_client_options() -> dict:
+    """Client options that make the SDK download blobs in AUDIO_DOWNLOAD_CHUNK_BYTES ranges."""
+    return {"max_single_get_size": AUDIO_DOWNLOAD_CHUNK_BYTES, "max_chunk_get_size": AUDIO_DOWNLOAD_CHUNK_BYTES}
+
+
+def _track_memory(delta: int):
+    with _stats_lock:
+        _stats["in_memory_bytes"] += delta
+        _stats["peak_in_memory_bytes"] = max(_stats["peak_in_memory_bytes"], _stats["in_memory_bytes"])
+
+
+def download_to_spool(blob_client) -> tempfile.SpooledTemporaryFile:
+    """
+    Streams a blob chunk by chunk into a SpooledTemporaryFile that stays in memory up to
+    AUDIO_SPOOL_MAX_MEMORY_MB and spills to disk beyond that. Call release_spool() when done.
+    """
+    max_memory = int(AUDIO_SPOOL_MAX_MEMORY_MB * 1024 * 1024)
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    spool.held_bytes = 0  # audio of this spool in RAM; 0 once it spilled to disk (beyond max_memory)
+    with _stats_lock:
+        _stats["downloads"] += 1
+        _stats["in_flight"] += 1
+
+    written = 0
+    try:
+        downloader = blob_client.download_blob()
+        for chunk in downloader.chunks():
+            _track_memory(len(chunk))
+            spool.write(chunk)
+            written += len(chunk)
+            held = written if written <= max_memory else 0
+            _track_memory(held - spool.held_bytes - len(chunk))
+            spool.held_bytes = held
+            with _stats_lock:
+                _stats["bytes_downloaded"] += len(chunk)
+    except Exception:
+        release_spool(spool)
+        raise
+
+    spilled = written > max_memory
+    if spilled:
+        with _stats_lock:
+            _stats["spilled_to_disk"] += 1
+    print(f"Downloaded {written / 1024 / 1024:.1f} MB of audio ({'spooled to disk' if spilled else 'in memory'})")
+    spool.seek(0)
+    return spool
+
+
+def release_spool(spool):
+    held = getattr(spool, "held_bytes", 0)
+    spool.close()
+    with _stats_lock:
+        _stats["in_flight"] -= 1
+        _stats["in_memory_bytes"] -= held
+
+
+def _wav_duration(header: bytes) -> float | None:
+    """Duration from a RIFF/WAVE header (fmt byte rate and data chunk size), or None."""
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    pos, byte_rate = 12, None
+    while pos + 8 <= len(header):
+        chunk_id, chunk_size = header[pos:pos + 4], struct.unpack("<I", header[pos + 4:pos + 8])[0]
+        if chunk_id == b"fmt " and pos + 20 <= len(header):
+            byte_rate = struct.unpack("<I", header[pos + 16:pos + 20])[0]
+        elif chunk_id == b"data":
+            return chunk_size / byte_rate if byte_rate else None
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def probe_duration(spool) -> int:
+    """
+    Audio duration in seconds. WAV is read from the header bytes only; other formats go
+    through mutagen, which seeks to the frames/atoms it needs rather than reading the file.
+    """
+    header = spool.read(AUDIO_HEADER_PROBE_BYTES)
+    spool.seek(0)
+    duration = _wav_duration(header)
+    if duration is None:
+        # auto-detect format (mp3, flac, ogg, m4a, etc.)
+        audio = File(spool)
+        spool.seek(0)
+        duration = audio.info.length if audio is not None and audio.info is not None else 0
+    return int(duration)
+
+
+def download_stats() -> dict:
+    with _stats_lock:
+        return {**_stats, "max_in_memory_bytes_per_download": int(AUDIO_SPOOL_MAX_MEMORY_MB * 1024 * 1024)
+                + AUDIO_DOWNLOAD_CHUNK_BYTES}
@@ -0,0 +1,169 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, List, Tuple
+import numpy as np
+
+FFMPEG_PATH = shutil.which("ffmpeg") or shutil.which("ffmpeg.exe") or os.getenv("FFMPEG_PATH")
+
+# Whisper on Azure rejects uploads above 25 MB; files above this size are always split
+WHISPER_MAX_UPLOAD_MB = float(os.getenv("WHISPER_MAX_UPLOAD_MB", "24"))
+# Recordings longer than this are split even if they fit in one upload, to transcribe pieces in parallel
+AUDIO_SPLIT_MIN_SECONDS = int(os.getenv("AUDIO_SPLIT_MIN_SECONDS", "900"))
+AUDIO_SPLIT_TARGET_SECONDS = int(os.getenv("AUDIO_SPLIT_TARGET_SECONDS", "600"))
+AUDIO_SPLIT_OVERLAP_SECONDS = float(os.getenv("AUDIO_SPLIT_OVERLAP_SECONDS", "2"))
+AUDIO_SPLIT_MAX_WORKERS = int(os.getenv("AUDIO_SPLIT_MAX_WORKERS", "4"))
+
+# How far around a target cut point to look for silence, and what counts as silence
+SILENCE_SEARCH_MS = 30_000
+SILENCE_MIN_LEN_MS = 400
+SILENCE_THRESH_DB = -16  # relative to the recording's average loudness
+# Silence is detected on a mono 8 kHz decode streamed from ffmpeg, as the loudness of 10 ms frames
+SILENCE_SAMPLE_RATE = 8000
+SILENCE_FRAME_MS = 10
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+def should_split(size_bytes: int, duration_seconds: float) -> bool:
+    if not FFMPEG_PATH:
+        return False
+    return size_bytes > WHISPER_MAX_UPLOAD_MB * 1024 * 1024 or duration_seconds > AUDIO_SPLIT_MIN_SECONDS
+
+
+def frame_loudness(path: str) -> Tuple[np.ndarray, float]:
+    """
+    dBFS of every SILENCE_FRAME_MS frame of the recording and its average dBFS. The audio is
+    decoded by ffmpeg to mono 8 kHz and read a second at a time, so only the per-frame
+    loudness (~1.5 MB per hour) is kept in memory, never the decoded recording.
+    """
+    frame_samples = SILENCE_SAMPLE_RATE * SILENCE_FRAME_MS // 1000
+    frame_bytes = frame_samples * 2
+    process = subprocess.Popen(
+        [FFMPEG_PATH, "-v", "error", "-i", path, "-ac", "1", "-ar", str(SILENCE_SAMPLE_RATE), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    power, pending = [], b""
+    try:
+        for data in iter(lambda: process.stdout.read(frame_bytes * 100), b""):
+            data = pending + data
+            usable = len(data) - len(data) % frame_bytes
+            pending = data[usable:]
+            samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32).reshape(-1, frame_samples)
+            power.append(np.mean(samples * samples, axis=1))
+    finally:
+        process.stdout.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg could not decode the audio (exit code {process.returncode})")
+
+    power = np.concatenate(power) if power else np.zeros(0, dtype=np.float32)
+    full_scale = 32768.0 ** 2
+    with np.errstate(divide="ignore"):
+        frames_db = 10 * np.log10(power / full_scale)
+        average_db = 10 * np.log10(power.mean() / full_scale) if len(power) else float("-inf")
+    return frames_db, float(average_db)
+
+
+def find_silences(frames_db: np.ndarray, start_ms: int, end_ms: int, threshold: float) -> List[Tuple[int, int]]:
+    """(start_ms, end_ms) of the silences of at least SILENCE_MIN_LEN_MS between start_ms and end_ms."""
+    quiet = frames_db[start_ms // SILENCE_FRAME_MS:end_ms // SILENCE_FRAME_MS] < threshold
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], quiet.astype(np.int8), [0]))))
+    silences = []
+    for run_start, run_end in zip(edges[::2], edges[1::2]):
+        if (run_end - run_start) * SILENCE_FRAME_MS >= SILENCE_MIN_LEN_MS:
+            silences.append((start_ms + int(run_start) * SILENCE_FRAME_MS, start_ms + int(run_end) * SILENCE_FRAME_MS))
+    return silences
+
+
+def find_cut_points(frames_db: np.ndarray, average_db: float, target_ms: int) -> List[int]:
+    """
+    Picks cut points roughly every target_ms, each moved to the middle of the silence
+    nearest to the target (within SILENCE_SEARCH_MS); falls back to a hard cut.
+    """
+    cuts = []
+    total_ms = len(frames_db) * SILENCE_FRAME_MS
+    threshold = average_db + SILENCE_THRESH_DB
+    target = target_ms
+    while target < total_ms - target_ms // 4:
+        window_start = max(target - SILENCE_SEARCH_MS, (cuts[-1] if cuts else 0) + 1000)
+        window_end = min(target + SILENCE_SEARCH_MS, total_ms)
+        silences = find_silences(frames_db, window_start, window_end, threshold)
+        if silences:
+            midpoints = [(start + end) // 2 for start, end in silences]
+            cut = min(midpoints, key=lambda point: abs(point - target))
+        else:
+            cut = target
+        cuts.append(cut)
+        target = cut + target_ms
+    return cuts
+
+
+def export_piece(path: str, start_ms: int, end_ms: int) -> BytesIO:
+    """Cuts [start_ms, end_ms) straight from the file with ffmpeg and encodes it as mono mp3."""
+    result = subprocess.run(
+        [FFMPEG_PATH, "-v", "error", "-ss", f"{start_ms / 1000:.3f}", "-t", f"{(end_ms - start_ms) / 1000:.3f}",
+         "-i", path, "-vn", "-ac", "1", "-ar", "16000", "-b:a", "64k", "-f", "mp3", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not cut the audio: {result.stderr.decode(errors='replace')[-500:]}")
+    return BytesIO(result.stdout)
+
+
+def stitch_pieces(pieces: List[Tuple[float, float, float, dict]]) -> dict:
+    """
+    pieces: (owned_start, owned_end, offset, transcription) per piece, in order, all in seconds.
+    Shifts every segment by its piece offset and keeps, in overlapping regions, only the
+    segments whose midpoint falls inside the piece's owned range, so nothing is duplicated.
+    """
+    segments = []
+    for owned_start, owned_end, offset, transcription in pieces:
+        for segment in transcription.get("segments", []):
+            start, end = segment["start"] + offset, segment["end"] + offset
+            if owned_start <= (start + end) / 2 < owned_end:
+                segments.append({"start": round(start, 2), "end": round(end, 2), "text": segment["text"]})
+    return {
+        "text": " ".join(segment["text"].strip() for segment in segments),
+        "segments": segments,
+    }
+
+
+def transcribe_in_pieces(audio_file, transcribe_piece: Callable[[BytesIO], dict]) -> dict:
+    """
+    Cuts the recording at silences into overlapping pieces, transcribes them concurrently
+    with `transcribe_piece(fileobj) -> {"text", "segments"}` and stitches the results
+    back together with global timestamps. Returns {"text", "segments", "duration"}.
+    The recording is never decoded into memory: ffmpeg reads it from a temp file, streaming it
+    for silence detection and cutting each piece directly, so only the encoded pieces being
+    transcribed (at most AUDIO_SPLIT_MAX_WORKERS) are held in RAM.
+    """
+    # ffmpeg needs a path to seek in; the download spool is copied to disk chunk by chunk
+    source = tempfile.NamedTemporaryFile(delete=False, suffix=".audio")
+    try:
+        with source:
+            shutil.copyfileobj(audio_file, source, COPY_CHUNK_BYTES)
+        audio_file.seek(0)
+
+        frames_db, average_db = frame_loudness(source.name)
+        total_ms = len(frames_db) * SILENCE_FRAME_MS
+        bounds = [0] + find_cut_points(frames_db, average_db, AUDIO_SPLIT_TARGET_SECONDS * 1000) + [total_ms]
+        del frames_db
+        overlap_ms = int(AUDIO_SPLIT_OVERLAP_SECONDS * 1000)
+
+        def run(i: int) -> Tuple[float, float, float, dict]:
+            export_start = max(0, bounds[i] - overlap_ms)
+            export_end = min(total_ms, bounds[i + 1] + overlap_ms)
+            piece = export_piece(source.name, export_start, export_end)
+            piece.name = f"piece_{i}.mp3"
+            owned_end = bounds[i + 1] / 1000 if i + 2 < len(bounds) else float("inf")
+            return bounds[i] / 1000, owned_end, export_start / 1000, transcribe_piece(piece)
+
+        with ThreadPoolExecutor(max_workers=AUDIO_SPLIT_MAX_WORKERS) as executor:
+            pieces = list(executor.map(run, range(len(bounds) - 1)))
+    finally:
+        os.remove(source.name)
+
+    print(f"Transcribed {len(pieces)} audio pieces in parallel ({total_ms / 1000:.0f}s of audio)")
+    return {**stitch_pieces(pieces), "duration": int(total_ms / 1000)}
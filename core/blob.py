@@ -8,13 +8,21 @@ from fastapi import  UploadFile
 
 AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 AZURE_STORAGE_CONTAINER_NAME = os.getenv("AZURE_STORAGE_CONTAINER_NAME")  
+# Report uploads run on the outbox worker under a lease, so each Blob operation is bounded:
+# at most 1 + BLOB_RETRY_TOTAL attempts of (connect + read) timeouts, plus the SDK's backoff between them
+BLOB_CONNECT_TIMEOUT_SECONDS = 10
+BLOB_READ_TIMEOUT_SECONDS = 60
+BLOB_RETRY_TOTAL = 2
 
 
 def upload_pdf_to_blob(buffer, filename: str, prefix: str = "fallback") -> str:
     """
     Uploads PDF buffer to Azure Blob Storage and returns blob URL.
     """
-    blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+    blob_service_client = BlobServiceClient.from_connection_string(
+        AZURE_STORAGE_CONNECTION_STRING, connection_timeout=BLOB_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=BLOB_READ_TIMEOUT_SECONDS, retry_total=BLOB_RETRY_TOTAL,
+    )
     container_client = blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
         
     try:
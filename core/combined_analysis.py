@@ -0,0 +1,90 @@
+import json
+from typing import List, Optional
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import ValidationError
+from core.llm_cache import cached_invoke
+from core.models import CombinedAnalysisResult
+from core.summarize import clean_and_parse_json
+
+COMBINED_PROMPT_VERSION = "combined-v1"
+
+
+def get_combined_analysis_prompt() -> ChatPromptTemplate:
+    systemContent = '''
+You are an assistant that analyzes a call transcription in a single pass. The transcription is given as numbered segments with their start time in seconds.
+Return one JSON object, valid against the JSON schema below, containing:
+- "call_summary": A concise summary of the call, capturing all key points discussed.
+- "sentiment": An aspect-based sentiment narrative that integrates tone and emotional indicators such as frustration, calmness or enthusiasm.
+- "sentiment_score": An integer overall sentiment score (1-10) reflecting words used, tone and emotional nuances.
+- "call_purpose": The main objective of the call.
+- "speaker_insights": An object with the keys "Customer" and "Agent", each a descriptive insight including the inferred emotional state and tone.
+- "Agent_rating": The Agent's performance out of 10 (8-10 for polite, empathetic handling; below 4 for inappropriate tone or no empathy).
+- "Customer_name" / "Agent_name": The names mentioned in the call, or NA.
+- "action_items": Follow-up tasks for the Agent, as [{{"task": "<description>"}}].
+- "segment_sentiments": An object mapping EVERY segment number to "positive", "neutral" or "negative".
+- "call_outs": The major call-outs of the call, as objects with "time_sec" (segment start time), "label" and "description".
+- "anomaly_detection": {{"isAnomaly", "anomalyCount", "reasons"}} - whether the call shows possible fraud: requests for sensitive data (SSN, card numbers, CVV, PIN, passwords, bank details, OTP/2FA codes, security answers), repeated attempts to extract account details, contradictory identity statements, scripted scam patterns or pressure tactics. Keep reasons short; anomalyCount is the number of reasons.
+
+JSON schema:
+{schema}
+
+Return the JSON object only, without any extra text.
+'''
+    messages = [("system", systemContent), ("human", "Segments:\n{segments}")]
+    return ChatPromptTemplate.from_messages(messages)
+
+
+def parse_combined_analysis(response_text: str) -> Optional[CombinedAnalysisResult]:
+    """Parses and validates the model response; None when it is not valid against the schema."""
+    parsed = clean_and_parse_json(response_text or "")
+    if parsed is None:
+        return None
+    try:
+        return CombinedAnalysisResult.model_validate(parsed)
+    except ValidationError as e:
+        print(f"Combined analysis response failed validation: {e}")
+        return None
+
+
+def analyze_call_combined(segments: List[dict], llm) -> Optional[dict]:
+    """
+    Sentiment per segment, summary fields, call-outs and anomaly flags of a call from one LLM request.
+    Returns the State update, or None when no valid response could be obtained.
+    """
+    numbered = "\n".join(
+        f"[{i}] {round(s['start'], 2)}s: {json.dumps(s['text'].strip(), ensure_ascii=False)}"
+        for i, s in enumerate(segments)
+    )
+    schema = json.dumps(CombinedAnalysisResult.model_json_schema())
+    try:
+        response = cached_invoke(
+            get_combined_analysis_prompt(), llm, {"schema": schema, "segments": numbered}, COMBINED_PROMPT_VERSION,
+            is_valid=lambda content: parse_combined_analysis(content) is not None
+        )
+    except Exception as e:
+        print(f"Combined analysis failed: {e}")
+        return None
+    result = parse_combined_analysis(response)
+    if result is None:
+        return None
+
+    anomaly = result.anomaly_detection.model_dump()
+    anomaly["anomalyCount"] = len(anomaly["reasons"])
+    return {
+        "call_summary": result.call_summary,
+        "sentiment": result.sentiment,
+        "sentiment_score": result.sentiment_score,
+        "call_purpose": result.call_purpose,
+        "speaker_insights": result.speaker_insights,
+        "action_items": result.action_items,
+        "Agent_rating": result.Agent_rating,
+        "Customer_name": result.Customer_name,
+        "Agent_name": result.Agent_name,
+        "sentiment_chunks": [
+            {"time_sec": round(s["start"], 2), "text": s["text"].strip(),
+             "sentiment": result.segment_sentiments.get(str(i), "neutral")}
+            for i, s in enumerate(segments)
+        ],
+        "call_outs": [{**item.model_dump(), "time_sec": int(item.time_sec)} for item in result.call_outs],
+        "anomaly_detection": anomaly,
+    }
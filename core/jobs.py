@@ -0,0 +1,250 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from core.disk_cache import CACHE_DIR
+from core.processing import process_call_file, resolve_incidents
+from core.state_store import call_state_store
+
+# Worker pool shared by every submitted job (files of all jobs queue here)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs kept for status/results polling
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "200"))
+# Jobs and their per-file records live in a SQLite file on the host, so every worker process
+# can answer /jobs/{job_id} and jobs survive restarts
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+# Every worker process renews the lease of the files it owns each JOB_HEARTBEAT_SECONDS; files whose lease
+# lapsed (owner restarted or crashed) are re-queued by another worker
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+
+# Identifies this worker process in job_files (PIDs repeat across container restarts and sibling workers)
+_BOOT_ID = uuid.uuid4().hex
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="call-job")
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(JOB_STORE_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:  # commit on success, rollback on error
+            yield conn
+    finally:
+        conn.close()
+
+
+def _init_db():
+    os.makedirs(os.path.dirname(JOB_STORE_PATH), exist_ok=True)
+    with _connect() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, model_option TEXT NOT NULL, incremental INTEGER NOT NULL,"
+            " analysis_mode TEXT NOT NULL, created_at TEXT NOT NULL, finished_at TEXT, incidents TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_files ("
+            " job_id TEXT NOT NULL, filename TEXT NOT NULL, audio_path TEXT NOT NULL, status TEXT NOT NULL,"
+            " error TEXT, result TEXT, owner TEXT, lease_until REAL, PRIMARY KEY (job_id, filename))"
+        )
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(job_files)")}
+        for column, column_type in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE job_files ADD COLUMN {column} {column_type}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_job_files_status ON job_files (status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at)")
+
+
+def _job_status(statuses) -> str:
+    statuses = list(statuses)
+    if all(s == "queued" for s in statuses):
+        return "queued"
+    if any(s in ("queued", "running") for s in statuses):
+        return "running"
+    if all(s == "failed" for s in statuses):
+        return "failed"
+    if any(s == "failed" for s in statuses):
+        return "completed_with_errors"
+    return "completed"
+
+
+def _evict_finished_jobs(conn):
+    """Drop the oldest finished jobs once more than JOB_RETENTION are kept."""
+    conn.execute(
+        "DELETE FROM job_files WHERE job_id IN (SELECT job_id FROM jobs WHERE finished_at IS NOT NULL"
+        " ORDER BY finished_at DESC LIMIT -1 OFFSET ?)", (JOB_RETENTION,)
+    )
+    conn.execute(
+        "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE finished_at IS NOT NULL"
+        " ORDER BY finished_at DESC LIMIT -1 OFFSET ?)", (JOB_RETENTION,)
+    )
+
+
+def _finish_job(job_id: str):
+    """Resolves the whole batch's incident numbers at once and marks the job finished."""
+    with _connect() as conn:
+        filenames = [row["filename"] for row in conn.execute(
+            "SELECT filename FROM job_files WHERE job_id = ? AND status = 'completed'", (job_id,)
+        )]
+    states = {filename: state for filename in filenames if (state := call_state_store.get(filename))}
+    incidents = resolve_incidents(states)
+    with _connect() as conn:
+        conn.execute("UPDATE jobs SET incidents = ?, finished_at = ? WHERE job_id = ?",
+                     (json.dumps(incidents), datetime.utcnow().isoformat(), job_id))
+        _evict_finished_jobs(conn)
+
+
+def _run_file(job_id: str, filename: str, audio_path: str, model_option: str, incremental: bool, analysis_mode: str):
+    with _connect() as conn:
+        conn.execute("UPDATE job_files SET status = 'running', owner = ?, lease_until = ? WHERE job_id = ? AND filename = ?",
+                     (_BOOT_ID, time.time() + JOB_LEASE_SECONDS, job_id, filename))
+
+    try:
+        _, response = process_call_file(filename, audio_path, model_option, incremental=incremental,
+                                        analysis_mode=analysis_mode)
+        update = ("completed", None, response.model_dump_json())
+    except Exception as e:
+        print(f"Job {job_id}: processing {filename} failed: {e}")
+        update = ("failed", str(e), None)
+
+    with _connect() as conn:
+        # Serialized with the other files' updates, so exactly one worker sees the job's last file finish
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE job_files SET status = ?, error = ?, result = ? WHERE job_id = ? AND filename = ?",
+                     (*update, job_id, filename))
+        remaining = conn.execute(
+            "SELECT COUNT(*) FROM job_files WHERE job_id = ? AND status IN ('queued', 'running')", (job_id,)
+        ).fetchone()[0]
+
+    if remaining == 0:
+        _finish_job(job_id)
+
+
+def submit_job(audio_paths: Dict[str, str], model_option: str, incremental: bool = False,
+               analysis_mode: str = "default") -> str:
+    """
+    Queues every file of a batch on the background worker pool and returns the job id right away.
+    """
+    job_id = uuid.uuid4().hex
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (job_id, model_option, incremental, analysis_mode, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, model_option, int(incremental), analysis_mode, datetime.utcnow().isoformat()),
+        )
+        conn.executemany(
+            "INSERT INTO job_files (job_id, filename, audio_path, status, owner, lease_until)"
+            " VALUES (?, ?, ?, 'queued', ?, ?)",
+            [(job_id, filename, audio_path, _BOOT_ID, time.time() + JOB_LEASE_SECONDS)
+             for filename, audio_path in audio_paths.items()],
+        )
+    start_job_heartbeat()
+
+    for filename, audio_path in audio_paths.items():
+        _executor.submit(_run_file, job_id, filename, audio_path, model_option, incremental, analysis_mode)
+    return job_id
+
+
+def _renew_leases():
+    with _connect() as conn:
+        conn.execute("UPDATE job_files SET lease_until = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                     (time.time() + JOB_LEASE_SECONDS, _BOOT_ID))
+
+
+def resume_jobs():
+    """
+    Re-queues on this worker the files of unfinished jobs whose owner's lease lapsed (restart or crash),
+    and finishes jobs whose last file completed but whose incidents were never resolved.
+    """
+    now = time.time()
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")  # two workers must not claim the same files
+        orphans = conn.execute(
+            "SELECT f.job_id, f.filename, f.audio_path, j.model_option, j.incremental, j.analysis_mode"
+            " FROM job_files f JOIN jobs j ON j.job_id = f.job_id"
+            " WHERE f.status IN ('queued', 'running') AND (f.lease_until IS NULL OR f.lease_until < ?)", (now,)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE job_files SET status = 'queued', owner = ?, lease_until = ? WHERE job_id = ? AND filename = ?",
+            [(_BOOT_ID, now + JOB_LEASE_SECONDS, row["job_id"], row["filename"]) for row in orphans],
+        )
+        # Unresolved for a whole lease: the worker that finished the last file died before resolving incidents
+        unfinished = [row["job_id"] for row in conn.execute(
+            "SELECT job_id FROM jobs j WHERE finished_at IS NULL AND NOT EXISTS"
+            " (SELECT 1 FROM job_files f WHERE f.job_id = j.job_id"
+            "  AND (f.status IN ('queued', 'running') OR f.lease_until >= ?))", (now - JOB_LEASE_SECONDS,)
+        )]
+        conn.executemany(
+            "UPDATE job_files SET lease_until = ? WHERE job_id = ?", [(now, job_id) for job_id in unfinished]
+        )
+
+    if orphans:
+        print(f"Resuming {len(orphans)} interrupted job file(s)")
+    for row in orphans:
+        _executor.submit(_run_file, row["job_id"], row["filename"], row["audio_path"], row["model_option"],
+                         bool(row["incremental"]), row["analysis_mode"])
+    for job_id in unfinished:
+        _executor.submit(_finish_job, job_id)
+
+
+def _heartbeat_loop():
+    while True:
+        try:
+            _renew_leases()
+            resume_jobs()
+        except Exception as e:
+            print(f"Job heartbeat error: {e}")
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+
+
+_heartbeat: Optional[threading.Thread] = None
+_heartbeat_lock = threading.Lock()
+
+
+def start_job_heartbeat():
+    """
+    Starts this process's heartbeat thread once (safe to call repeatedly): it keeps the leases of the
+    files this worker owns and picks up the files of workers that went away.
+    """
+    global _heartbeat
+    with _heartbeat_lock:
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_heartbeat_loop, daemon=True, name="job-heartbeat")
+            _heartbeat.start()
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """
+    Returns a snapshot of the job with its computed status, or None for unknown/evicted jobs.
+    """
+    with _connect() as conn:
+        job = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if job is None:
+            return None
+        rows = conn.execute("SELECT filename, status, error, result FROM job_files WHERE job_id = ?",
+                            (job_id,)).fetchall()
+
+    files = {row["filename"]: {"status": row["status"], "error": row["error"]} for row in rows}
+    return {
+        "job_id": job["job_id"],
+        "model_option": job["model_option"],
+        "created_at": datetime.fromisoformat(job["created_at"]),
+        "finished_at": datetime.fromisoformat(job["finished_at"]) if job["finished_at"] else None,
+        "status": _job_status(f["status"] for f in files.values()),
+        "files": files,
+        "results": {row["filename"]: json.loads(row["result"]) for row in rows if row["result"]},
+        "incidents": json.loads(job["incidents"]) if job["incidents"] else {},
+        "total": len(files),
+        "completed": sum(1 for f in files.values() if f["status"] == "completed"),
+        "failed": sum(1 for f in files.values() if f["status"] == "failed"),
+    }
+
+
+_init_db()
@@ -1,4 +1,7 @@
 from langchain_openai import AzureChatOpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI
+from functools import lru_cache
+import httpx
 import os
 
 endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -6,8 +9,79 @@ deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o")
 subscription_key = os.getenv("AZURE_OPENAI_KEY")
 api_version = "2024-02-01"
 
+# Connection pools shared by every LLM/Whisper call of the process (keep-alive, bounded)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "32"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "300"))
+# 429s and transient errors are retried by core.llm_scheduler (which honours Retry-After and adapts
+# concurrency), not by the SDKs
+SDK_MAX_RETRIES = 0
+
+
+def _pool_options() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=60,
+        ),
+        "timeout": httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10),
+    }
+
+
+# One sync and one async pool per deployment endpoint
+@lru_cache(maxsize=None)
+def get_http_client(pool: str) -> httpx.Client:
+    return httpx.Client(**_pool_options())
+
+
+@lru_cache(maxsize=None)
+def get_async_http_client(pool: str) -> httpx.AsyncClient:
+    return httpx.AsyncClient(**_pool_options())
+
+
 client = AzureChatOpenAI(
     api_version=api_version,
     azure_endpoint=endpoint,
+    azure_deployment=deployment,
     api_key=subscription_key,
+    http_client=get_http_client("chat"),
+    http_async_client=get_async_http_client("chat"),
+    max_retries=SDK_MAX_RETRIES,
 )
+
+
+@lru_cache(maxsize=None)
+def get_openai_client() -> AzureOpenAI:
+    """Raw OpenAI client for the chat deployment (structured outputs), on the shared pool."""
+    return AzureOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_KEY"),
+        api_version="2025-01-01-preview",
+        http_client=get_http_client("chat"),
+        max_retries=SDK_MAX_RETRIES,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_async_openai_client() -> AsyncAzureOpenAI:
+    """Async variant of get_openai_client, for code running on the event loop."""
+    return AsyncAzureOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_KEY"),
+        api_version="2025-01-01-preview",
+        http_client=get_async_http_client("chat"),
+        max_retries=SDK_MAX_RETRIES,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_whisper_client() -> AzureOpenAI:
+    """OpenAI client for the Whisper deployment, on its own shared pool."""
+    return AzureOpenAI(
+        api_key=os.getenv("OPENAI_KEY_W"),
+        api_version="2024-02-01",
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT_W"),
+        http_client=get_http_client("whisper"),
+        max_retries=SDK_MAX_RETRIES,
+    )
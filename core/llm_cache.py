@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from typing import Awaitable, Callable, Optional
+from core.disk_cache import DiskCache
+from core.llm_scheduler import llm_scheduler, estimate_tokens, message_tokens
+
+# Deterministic LLM response cache: key = model/deployment + prompt template version + rendered input hash.
+# Backend: "disk" (shared SQLite file on the host), "sql" (LLMResponseCache table in SQL Server) or "off".
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "disk").lower()
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+
+
+class SqlServerCache:
+    """
+    Same get/set/stats interface as DiskCache, stored in SQL Server so every host shares it.
+    Expired and least recently used entries are evicted every `evict_every` writes.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, evict_every: int = 100):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0}
+
+    def _count(self, counter: str, n: int = 1):
+        with self._lock:
+            self._counters[counter] += n
+
+    def get(self, key: str):
+        from dbs.llm_cache import get_llm_cache_entry
+        try:
+            value = get_llm_cache_entry(key, self.ttl_seconds)
+        except Exception as e:
+            print(f"LLM cache read failed: {e}")
+            self._count("errors")
+            return None
+        self._count("hits" if value is not None else "misses")
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value):
+        from dbs.llm_cache import upsert_llm_cache_entry, evict_llm_cache_entries
+        try:
+            upsert_llm_cache_entry(key, json.dumps(value))
+            self._count("writes")
+            if self._counters["writes"] % self.evict_every == 0:
+                self._count("evictions", evict_llm_cache_entries(self.ttl_seconds, self.max_entries))
+        except Exception as e:
+            print(f"LLM cache write failed: {e}")
+            self._count("errors")
+
+    def stats(self) -> dict:
+        from dbs.llm_cache import count_llm_cache_entries
+        try:
+            entries = count_llm_cache_entries()
+        except Exception as e:
+            print(f"LLM cache count failed: {e}")
+            entries = None
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {**counters, "hit_rate": counters["hits"] / lookups if lookups else None, "entries": entries,
+                "max_entries": self.max_entries}
+
+
+if LLM_CACHE_BACKEND == "sql":
+    llm_cache = SqlServerCache(LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES)
+elif LLM_CACHE_BACKEND == "disk":
+    llm_cache = DiskCache("llm_responses", max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024, ttl_seconds=LLM_CACHE_TTL_SECONDS)
+else:
+    llm_cache = None
+
+
+def deployment_name(llm) -> str:
+    """The Azure deployment (or provider model) a LangChain chat model calls - the key of its rate limits."""
+    for attr in ("deployment_name", "model_name", "model"):
+        value = getattr(llm, attr, None)
+        if value:
+            return value
+    return type(llm).__name__
+
+
+def model_id(llm) -> str:
+    """Identifies the model/deployment behind a LangChain chat model for cache keys."""
+    return f"{type(llm).__name__}:{deployment_name(llm)}"
+
+
+def cache_key(model: str, prompt_version: str, rendered_input: str) -> str:
+    input_hash = hashlib.sha256(rendered_input.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}|{prompt_version}|{input_hash}".encode("utf-8")).hexdigest()
+
+
+def cached_call(model: str, prompt_version: str, rendered_input: str, call: Callable[[], str],
+                is_valid: Optional[Callable[[str], bool]] = None) -> str:
+    """
+    Returns the cached response text for this model/prompt/input, otherwise runs `call` and stores its result.
+    When `is_valid` is given, only responses it accepts are stored, so a retry is not served a bad answer.
+    """
+    if llm_cache is None:
+        return call()
+    key = cache_key(model, prompt_version, rendered_input)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    content = call()
+    if content and (is_valid is None or is_valid(content)):
+        llm_cache.set(key, content)
+    return content
+
+
+async def acached_call(model: str, prompt_version: str, rendered_input: str, call: Callable[[], Awaitable[str]],
+                       is_valid: Optional[Callable[[str], bool]] = None) -> str:
+    """
+    Async cached_call: awaits `call` on a miss; cache reads/writes run in a worker thread.
+    """
+    if llm_cache is None:
+        return await call()
+    key = cache_key(model, prompt_version, rendered_input)
+    cached = await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        return cached
+    content = await call()
+    if content and (is_valid is None or is_valid(content)):
+        await asyncio.to_thread(llm_cache.set, key, content)
+    return content
+
+
+def render_messages(messages) -> str:
+    return json.dumps([[m.type, m.content] for m in messages], ensure_ascii=False)
+
+
+def cached_invoke(prompt, llm, inputs: dict, prompt_version: str, is_valid: Optional[Callable[[str], bool]] = None) -> str:
+    """
+    Cached equivalent of `(prompt | llm).invoke(inputs).content`.
+    """
+    messages = prompt.format_messages(**inputs)
+    model, rendered = model_id(llm), render_messages(messages)
+
+    def call() -> str:
+        return llm_scheduler.run(deployment_name(llm), estimate_tokens(rendered), lambda: llm.invoke(messages), message_tokens).content
+
+    return cached_call(model, prompt_version, rendered, call, is_valid)
+
+
+async def acached_invoke(prompt, llm, inputs: dict, prompt_version: str,
+                         is_valid: Optional[Callable[[str], bool]] = None) -> str:
+    """
+    Async cached equivalent of `(await (prompt | llm).ainvoke(inputs)).content`.
+    """
+    messages = prompt.format_messages(**inputs)
+    model, rendered = model_id(llm), render_messages(messages)
+
+    async def call() -> str:
+        message = await llm_scheduler.arun(deployment_name(llm), estimate_tokens(rendered), lambda: llm.ainvoke(messages), message_tokens)
+        return message.content
+
+    return await acached_call(model, prompt_version, rendered, call, is_valid)
+
+
+def cache_stats() -> Optional[dict]:
+    return {"backend": LLM_CACHE_BACKEND, **llm_cache.stats()} if llm_cache is not None else None
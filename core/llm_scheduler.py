@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Per-deployment limits keyed by Azure deployment name (AZURE_OPENAI_DEPLOYMENT for chat and anomaly detection,
+# WHISPER_DEPLOYMENT for transcription; the model name for Groq), e.g.
+# LLM_RATE_LIMITS='{"gpt-4o": {"tpm": 150000, "rpm": 900}, "whispernew": {"rpm": 50}}'.
+# Deployments not listed use the defaults below.
+LLM_RATE_LIMITS = json.loads(os.getenv("LLM_RATE_LIMITS", "{}"))
+LLM_DEFAULT_TPM = int(os.getenv("LLM_DEFAULT_TPM", "240000"))
+LLM_DEFAULT_RPM = int(os.getenv("LLM_DEFAULT_RPM", "1440"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "800"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt + completion token estimate used to reserve TPM budget before a request."""
+    return len(text) // 4 + LLM_EXPECTED_OUTPUT_TOKENS
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _is_transient(error: Exception) -> bool:
+    """Connection drops, timeouts and 5xx responses: worth retrying as-is, unlike other 4xx errors."""
+    if any(cls.__name__ in ("APIConnectionError", "APITimeoutError") for cls in type(error).__mro__):
+        return True
+    status = _status_code(error)
+    return status is not None and (status == 408 or status >= 500)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait from Retry-After / retry-after-ms headers of a 429, if present."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class DeploymentLimiter:
+    """
+    Token buckets for TPM and RPM plus an adaptive concurrency limit for one deployment.
+    Concurrency grows by one after a run of successes and is halved on every 429 (AIMD).
+    """
+
+    def __init__(self, name: str, tpm: int, rpm: int, max_concurrency: int):
+        self.name = name
+        self.tpm = tpm
+        self.rpm = rpm
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = max(1, max_concurrency // 2)
+        self._tokens = float(tpm)
+        self._requests = float(rpm)
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._successes = 0
+        self._cond = threading.Condition()
+        self.metrics = {
+            "queue_depth": 0, "in_flight": 0, "requests": 0, "retries": 0, "throttle_events": 0,
+            "failures": 0, "tokens_reserved": 0, "tokens_used": 0, "wait_seconds_total": 0.0,
+        }
+
+    def _refill(self, now: float):
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Takes a slot if possible and returns 0, otherwise returns how long to wait. Caller holds the lock."""
+        now = time.monotonic()
+        self._refill(now)
+        tokens = min(tokens, self.tpm)
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self.metrics["in_flight"] >= self.concurrency_limit:
+            return 0.05
+        if self._requests < 1:
+            return (1 - self._requests) * 60 / self.rpm
+        if self._tokens < tokens:
+            return (tokens - self._tokens) * 60 / self.tpm
+        self._tokens -= tokens
+        self._requests -= 1
+        self.metrics["in_flight"] += 1
+        self.metrics["requests"] += 1
+        self.metrics["tokens_reserved"] += tokens
+        return 0
+
+    def acquire(self, tokens: int):
+        started = time.monotonic()
+        with self._cond:
+            self.metrics["queue_depth"] += 1
+            try:
+                while True:
+                    wait = self._try_acquire(tokens)
+                    if not wait:
+                        break
+                    self._cond.wait(timeout=min(wait, 1.0))
+            finally:
+                self.metrics["queue_depth"] -= 1
+                self.metrics["wait_seconds_total"] += time.monotonic() - started
+
+    async def acquire_async(self, tokens: int):
+        started = time.monotonic()
+        with self._cond:
+            self.metrics["queue_depth"] += 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_acquire(tokens)
+                if not wait:
+                    break
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            with self._cond:
+                self.metrics["queue_depth"] -= 1
+                self.metrics["wait_seconds_total"] += time.monotonic() - started
+
+    def release(self, outcome: str, retry_after: Optional[float] = None, tokens_used: Optional[int] = None,
+                retrying: bool = False):
+        """outcome: "success", "throttled" (429) or "failed" (anything else, retried when transient)."""
+        with self._cond:
+            if retrying:
+                self.metrics["retries"] += 1
+            self.metrics["in_flight"] -= 1
+            if tokens_used:
+                self.metrics["tokens_used"] += tokens_used
+            if outcome == "throttled":
+                self.metrics["throttle_events"] += 1
+                self._successes = 0
+                self.concurrency_limit = max(1, self.concurrency_limit // 2)
+                if retry_after:
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            elif outcome == "success":
+                self._successes += 1
+                if self._successes >= self.concurrency_limit and self.concurrency_limit < self.max_concurrency:
+                    self.concurrency_limit += 1
+                    self._successes = 0
+            else:
+                self.metrics["failures"] += 1
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self.metrics, "concurrency_limit": self.concurrency_limit, "tpm": self.tpm, "rpm": self.rpm}
+
+
+class LLMScheduler:
+    """
+    Central gate for every LLM and Whisper request: waits for TPM/RPM budget and a concurrency
+    slot on the deployment, retries 429s with backoff honouring Retry-After, retries transient
+    errors (connection drops, timeouts, 5xx) with backoff, and keeps metrics. The SDK clients
+    don't retry on their own (SDK_MAX_RETRIES = 0).
+    """
+
+    def __init__(self):
+        self._limiters: Dict[str, DeploymentLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, deployment: str) -> DeploymentLimiter:
+        with self._lock:
+            limiter = self._limiters.get(deployment)
+            if limiter is None:
+                limits = LLM_RATE_LIMITS.get(deployment, {})
+                limiter = DeploymentLimiter(
+                    deployment,
+                    tpm=int(limits.get("tpm", LLM_DEFAULT_TPM)),
+                    rpm=int(limits.get("rpm", LLM_DEFAULT_RPM)),
+                    max_concurrency=int(limits.get("max_concurrency", LLM_MAX_CONCURRENCY)),
+                )
+                self._limiters[deployment] = limiter
+            return limiter
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after
+        return min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+    def _release_error(self, limiter: DeploymentLimiter, error: Exception, attempt: int) -> Optional[float]:
+        """Records a failed attempt and returns the backoff before the next one, or None to give up."""
+        retrying = attempt < LLM_MAX_RETRIES
+        if _status_code(error) == 429:
+            retry_after = _retry_after(error)
+            limiter.release("throttled", retry_after, retrying=retrying)
+            return self._backoff(attempt, retry_after) if retrying else None
+        retrying = retrying and _is_transient(error)
+        limiter.release("failed", retrying=retrying)
+        return self._backoff(attempt, None) if retrying else None
+
+    def run(self, deployment: str, tokens: int, call: Callable[[], Any],
+            usage: Optional[Callable[[Any], Optional[int]]] = None) -> Any:
+        limiter = self.limiter(deployment)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            limiter.acquire(tokens)
+            try:
+                result = call()
+            except Exception as e:
+                backoff = self._release_error(limiter, e, attempt)
+                if backoff is None:
+                    raise
+                time.sleep(backoff)
+                continue
+            limiter.release("success", tokens_used=usage(result) if usage else None)
+            return result
+
+    async def arun(self, deployment: str, tokens: int, call: Callable[[], Awaitable[Any]],
+                   usage: Optional[Callable[[Any], Optional[int]]] = None) -> Any:
+        limiter = self.limiter(deployment)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await limiter.acquire_async(tokens)
+            try:
+                result = await call()
+            except Exception as e:
+                backoff = self._release_error(limiter, e, attempt)
+                if backoff is None:
+                    raise
+                await asyncio.sleep(backoff)
+                continue
+            limiter.release("success", tokens_used=usage(result) if usage else None)
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def message_tokens(message) -> Optional[int]:
+    """Total tokens of a LangChain AIMessage, when the provider reports usage."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("total_tokens")
+
+
+def completion_tokens(completion) -> Optional[int]:
+    """Total tokens of an OpenAI chat completion."""
+    usage = getattr(completion, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+llm_scheduler = LLMScheduler()
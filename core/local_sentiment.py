@@ -0,0 +1,104 @@
+import os
+import re
+from typing import List, Tuple
+import numpy as np
+from core.sentiment import classify_segment_sentiments
+
+# Segments scored below this confidence are sent to the LLM instead
+LOCAL_SENTIMENT_MIN_CONFIDENCE = float(os.getenv("LOCAL_SENTIMENT_MIN_CONFIDENCE", "0.6"))
+# Bump whenever the lexicon or scoring changes, so stored results are not reused by incremental runs
+LOCAL_SENTIMENT_VERSION = "lexicon-v2"
+
+# Word weights tuned for support-call speech (positive > 0, negative < 0)
+LEXICON = {
+    # positive
+    "thank": 1.0, "thanks": 1.0, "appreciate": 1.2, "appreciated": 1.2, "great": 1.2, "good": 0.8, "excellent": 1.5,
+    "perfect": 1.3, "wonderful": 1.4, "awesome": 1.4, "helpful": 1.2, "glad": 1.0, "happy": 1.1, "pleased": 1.1,
+    "resolved": 1.0, "fixed": 0.9, "works": 0.7, "working": 0.5, "sure": 0.3, "welcome": 0.6, "nice": 0.9,
+    "love": 1.2, "fantastic": 1.5, "amazing": 1.4, "satisfied": 1.1, "understand": 0.3, "absolutely": 0.5,
+    "definitely": 0.4, "quick": 0.6, "easy": 0.7, "pleasure": 1.0, "sorted": 0.8, "success": 1.0,
+    # negative
+    "problem": -0.8, "issue": -0.6, "issues": -0.6, "wrong": -1.0, "bad": -1.0, "terrible": -1.6, "horrible": -1.6,
+    "awful": -1.5, "angry": -1.4, "upset": -1.3, "frustrated": -1.5, "frustrating": -1.5, "annoyed": -1.3,
+    "annoying": -1.3, "disappointed": -1.4, "disappointing": -1.4, "unacceptable": -1.6, "ridiculous": -1.5,
+    "worst": -1.7, "broken": -1.0, "failed": -1.0, "fail": -0.9, "error": -0.7, "complaint": -1.1, "complain": -1.1,
+    "cancel": -0.9, "refund": -0.6, "waiting": -0.6, "waited": -0.8, "delay": -0.8, "delayed": -0.8,
+    "useless": -1.5, "hate": -1.5, "sorry": -0.3, "unfortunately": -0.8, "confused": -0.7,
+    "urgent": -0.7, "again": -0.3, "still": -0.3, "charged": -0.5, "overcharged": -1.3, "stuck": -0.9,
+    "waste": -1.3, "slow": -0.8, "crashed": -1.1, "lost": -0.8, "rude": -1.5, "escalate": -1.0, "supervisor": -0.7,
+}
+NEGATORS = {"not", "no", "never", "don't", "doesn't", "didn't", "isn't", "wasn't", "aren't", "won't", "can't",
+            "cannot", "couldn't", "haven't", "hasn't", "nothing", "without"}
+NEGATION_SCOPE = 3  # tokens after a negator whose polarity is flipped
+
+_VOCAB = {word: i for i, word in enumerate(LEXICON)}
+_WEIGHTS = np.array(list(LEXICON.values()), dtype=np.float32)
+_TOKEN_RE = re.compile(r"[a-z']+")
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _feature_matrix(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Signed lexicon counts per segment (rows) and word (columns) - words in the scope of a
+    negator count as -1 - plus the token count of every segment.
+    """
+    rows, cols, signs = [], [], []
+    lengths = np.zeros(len(texts), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = _tokenize(text)
+        lengths[row] = len(tokens)
+        negated_until = -1
+        for position, token in enumerate(tokens):
+            if token in NEGATORS:
+                negated_until = position + NEGATION_SCOPE
+                continue
+            col = _VOCAB.get(token)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+                signs.append(-1.0 if position <= negated_until else 1.0)
+
+    counts = np.zeros((len(texts), len(_VOCAB)), dtype=np.float32)
+    np.add.at(counts, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), np.array(signs, dtype=np.float32))
+    return counts, lengths
+
+
+def score_segments(texts: List[str]) -> Tuple[List[str], np.ndarray]:
+    """
+    Labels every segment at once from the lexicon and returns (labels, confidences in [0, 1]).
+    Confidence is high when the segment's cues agree and are dense, low when they are mixed or sparse,
+    and 0 when the segment has no lexicon word at all (no evidence either way); empty segments are
+    confidently neutral.
+    """
+    if not texts:
+        return [], np.zeros(0, dtype=np.float32)
+    counts, lengths = _feature_matrix(texts)
+    contributions = counts * _WEIGHTS                       # (segments, words)
+    positive = np.clip(contributions, 0, None).sum(axis=1)
+    negative = -np.clip(contributions, None, 0).sum(axis=1)
+    mass = positive + negative
+
+    polarity = np.divide(positive - negative, mass, out=np.zeros_like(mass), where=mass > 0)
+    density = np.minimum(1.0, mass / np.sqrt(np.maximum(lengths, 1)) * 2)
+    confidence = np.where(mass > 0, np.abs(polarity) * density, np.where(lengths == 0, 1.0, 0.0))
+
+    labels = np.where(mass == 0, "neutral", np.where(polarity > 0, "positive", "negative"))
+    return labels.tolist(), confidence
+
+
+def classify_segment_sentiments_local(texts: List[str], llm) -> List[str]:
+    """
+    Same contract as classify_segment_sentiments: segments the local model labels with at least
+    LOCAL_SENTIMENT_MIN_CONFIDENCE keep the local label, only the others go to the LLM.
+    """
+    labels, confidence = score_segments(texts)
+    uncertain = np.flatnonzero(confidence < LOCAL_SENTIMENT_MIN_CONFIDENCE).tolist()
+    print(f"Local sentiment: {len(texts) - len(uncertain)}/{len(texts)} segments labelled locally")
+    if uncertain:
+        llm_labels = classify_segment_sentiments([texts[i] for i in uncertain], llm)
+        for i, label in zip(uncertain, llm_labels):
+            labels[i] = label
+    return labels
@@ -1,4 +1,5 @@
-from typing import TypedDict, Optional,List,Dict,Any
+from typing import TypedDict, Optional,List,Dict,Any,Literal
+from datetime import datetime
 from pydantic import BaseModel,Field
 
 # In your response model
@@ -12,6 +13,9 @@ class CallOutItem(BaseModel):
 class ProcessRequest(BaseModel):
     filenames: List[str] # ✅ changed: support multiple files
     model_option: str
+    max_concurrency: Optional[int] = Field(default=None, ge=1) # capped by PROCESS_CALLS_CONCURRENCY
+    incremental: bool = False # reuse stored results of unchanged, already-analyzed recordings
+    analysis_mode: str = "default" # "default" (one LLM request per stage) or "combined" (single structured request)
 
 class AnomalyDetectionResult(BaseModel):
     isAnomaly: bool
@@ -33,14 +37,39 @@ class FileProcessResponse(BaseModel):
     call_outs: List[CallOutItem] = Field(default_factory=list) # New response field
     anomaly_detection: AnomalyDetectionResult 
     inc_number: Optional[str] = None 
+    inc_numbers: List[str] = Field(default_factory=list) # every incident number found in the call
+    from_previous_run: bool = False # served from the stored result of an unchanged recording
+
+# Structured output of the "combined" analysis mode: every LLM stage answered by one request
+class CombinedCallOutItem(BaseModel):
+    time_sec: float # segment start times are given to the model with decimals; truncated to CallOutItem's int
+    label: str
+    description: str
+
+class CombinedAnalysisResult(BaseModel):
+    call_summary: str
+    sentiment: str
+    sentiment_score: int
+    call_purpose: str
+    speaker_insights: Dict[str, str]
+    action_items: Optional[List[Dict[str, str]]] = None
+    Agent_rating: int
+    Customer_name: str
+    Agent_name: str
+    segment_sentiments: Dict[str, Literal["positive", "neutral", "negative"]] # segment index -> label
+    call_outs: List[CombinedCallOutItem] = Field(default_factory=list)
+    anomaly_detection: AnomalyDetectionResult
 
 class BatchProcessResponse(BaseModel):
     results: Dict[str, FileProcessResponse] # ✅ per filename
+    errors: Dict[str, str] = Field(default_factory=dict) # filename -> error, for files that failed
+    incidents: Dict[str, Optional[str]] = Field(default_factory=dict) # INC number -> ServiceNow sys_id (None: not found)
 
 
 class State(TypedDict):
     audio_path: str
     transcription: Optional[str]
+    segments: Optional[List[dict]]
     call_summary: Optional[str]
     sentiment: Optional[str]
     sentiment_score: Optional[int]
@@ -52,4 +81,45 @@ class State(TypedDict):
     action_items: Optional[Any]
     sentiment_chunks: Optional[List[dict]]
     call_outs: Optional[List[dict]]
+    anomaly_detection: Optional[dict]
+    email_sent: Optional[List[str]]
+    processing_fingerprint: Optional[str]
+    content_fingerprint: Optional[str] # blob MD5/ETag of the transcribed recording
+    incident_sys_ids: Optional[Dict[str, Optional[str]]]
     audio_duration:int
+
+
+# Background job models
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    results_url: str
+
+class JobFileStatus(BaseModel):
+    status: str # queued | running | completed | failed
+    error: Optional[str] = None
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str # queued | running | completed | completed_with_errors | failed
+    model_option: str
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    total: int
+    completed: int
+    failed: int
+    files: Dict[str, JobFileStatus]
+
+class JobResultsResponse(BaseModel):
+    job_id: str
+    status: str
+    results: Dict[str, FileProcessResponse] # files finished so far
+    errors: Dict[str, str] = Field(default_factory=dict)
+    incidents: Dict[str, Optional[str]] = Field(default_factory=dict) # resolved once every file has finished
+
+# Bulk report export: explicit filenames, or every call recorded in a date range
+class ReportExportRequest(BaseModel):
+    filenames: Optional[List[str]] = None
+    start_datetime: Optional[datetime] = None
+    end_datetime: Optional[datetime] = None
@@ -0,0 +1,240 @@
+import asyncio
+import os
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from core.models import State, CallOutItem, FileProcessResponse, ProcessRequest
+from core.report import process_email_notifications, get_pipeline, extract_inc_number, extract_inc_numbers, get_processing_fingerprint, processing_fingerprint
+from core.servicenow import get_servicenow_access_token, get_incident_sys_ids
+from core.state_store import call_state_store
+from dbs.audio import get_audio_files
+from dbs.statistics import insert_statistics
+
+# Max number of files of one batch processed at the same time
+PROCESS_CALLS_CONCURRENCY = int(os.getenv("PROCESS_CALLS_CONCURRENCY", "4"))
+
+
+# Progress event emitted when each pipeline node finishes, with the state keys it sends along
+STAGE_EVENTS = {
+    "transcribe": ("transcription_ready", ("transcription", "audio_duration")),
+    "sentiment": ("sentiment_chunks_ready", ("sentiment_chunks",)),
+    "summarize": ("summary_ready", ("call_summary", "sentiment", "sentiment_score", "call_purpose", "speaker_insights",
+                                    "action_items", "Agent_rating", "Customer_name", "Agent_name")),
+    "analyze_callouts": ("call_outs_ready", ("call_outs",)),
+    "detect_anomaly": ("anomaly_result", ("anomaly_detection",)),
+    # combined analysis mode: every stage's output at once
+    "combined": ("analysis_ready", ("call_summary", "sentiment", "sentiment_score", "call_purpose", "speaker_insights",
+                                    "action_items", "Agent_rating", "Customer_name", "Agent_name", "sentiment_chunks",
+                                    "call_outs", "anomaly_detection")),
+}
+
+
+def resolve_process_request(req: ProcessRequest) -> Tuple[Dict[str, str], int]:
+    """
+    Validates a processing request for the /process-calls routes: every file must exist (404) and the
+    model option / analysis mode must build a pipeline (400). Returns the audio paths of the distinct
+    filenames, in request order, and the batch concurrency capped by PROCESS_CALLS_CONCURRENCY.
+    """
+    files = get_audio_files()
+    for filename in req.filenames:
+        if filename not in files:
+            raise HTTPException(status_code=404, detail=f"Audio file not found: {filename}")
+
+    try:
+        get_pipeline(req.model_option, req.analysis_mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    concurrency = min(req.max_concurrency or PROCESS_CALLS_CONCURRENCY, PROCESS_CALLS_CONCURRENCY)
+    return {filename: files[filename] for filename in dict.fromkeys(req.filenames)}, concurrency
+
+
+def build_file_response(state: State, emails: List[str], from_previous_run: bool = False) -> FileProcessResponse:
+    # Convert call_outs to proper Pydantic models
+    call_out_items = [
+        CallOutItem(
+            time_sec=item["time_sec"],
+            label=item["label"],
+            description=item["description"]
+        )
+        for item in state.get("call_outs", [])
+    ]
+    anomaly_result = state.get("anomaly_detection") or {"isAnomaly": False, "anomalyCount": 0, "reasons": []}
+    return FileProcessResponse(
+        call_summary=state["call_summary"],
+        sentiment=state["sentiment"],
+        sentiment_score=state["sentiment_score"],
+        call_purpose=state["call_purpose"],
+        speaker_insights=state.get("speaker_insights"),
+        Agent_rating=state.get("Agent_rating"),
+        action_items=state.get("action_items"),
+        email_sent=emails,
+        sentiment_chunks=state.get("sentiment_chunks"),
+        Customer_name=state.get("Customer_name"),
+        Agent_name=state.get("Agent_name"),
+        call_outs=call_out_items,
+        anomaly_detection=anomaly_result,
+        inc_number=extract_inc_number(state),
+        inc_numbers=extract_inc_numbers(state),
+        from_previous_run=from_previous_run
+    )
+
+
+def process_call_file(filename: str, audio_path: str, model_option: str,
+                      on_event: Optional[Callable[[str, dict], None]] = None,
+                      incremental: bool = False, analysis_mode: str = "default",
+                      send_emails: bool = True) -> Tuple[State, FileProcessResponse]:
+    """
+    Runs the full chain for one audio file (pipeline incl. anomaly detection, emails, statistics).
+    With `send_emails=False` no notification emails go out (e.g. when back-processing old calls).
+    When `on_event(event, data)` is given, it is called as each stage finishes.
+    With `incremental`, a file whose content, model option and pipeline version match the stored
+    previous run is not reprocessed: the stored result is returned (no emails, no statistics update).
+    `analysis_mode` selects the default per-stage pipeline or the single-request "combined" one.
+    Blocking - meant to be run in a worker thread.
+    """
+    fingerprint = None
+    if incremental:
+        try:
+            fingerprint = get_processing_fingerprint(audio_path, model_option, analysis_mode)
+        except Exception as e:
+            print(f"Could not fingerprint {filename}: {e}")
+
+    if fingerprint:
+        previous = call_state_store.get(filename)
+        if previous and previous.get("processing_fingerprint") == fingerprint:
+            print(f"Unchanged since last run, reusing stored result: {filename}")
+            return previous, build_file_response(previous, previous.get("email_sent") or [], from_previous_run=True)
+
+    pipeline = get_pipeline(model_option, analysis_mode)
+    if on_event is None:
+        state = pipeline.invoke({"audio_path": audio_path})
+    else:
+        state = {"audio_path": audio_path}
+        for update in pipeline.stream(state, stream_mode="updates"):
+            for node, values in update.items():
+                state.update(values or {})
+                if node in STAGE_EVENTS:
+                    event, keys = STAGE_EVENTS[node]
+                    on_event(event, {key: state.get(key) for key in keys})
+
+    emails = process_email_notifications(state) if send_emails else []
+    if on_event is not None:
+        on_event("emails_sent", {"email_sent": emails})
+
+    if fingerprint is None and state.get("content_fingerprint"):
+        # Built from the blob properties transcription already fetched, so later incremental runs can match it
+        fingerprint = processing_fingerprint(state["content_fingerprint"], model_option, analysis_mode)
+    state = {**state, "email_sent": emails, "processing_fingerprint": fingerprint}
+    call_state_store.put(filename, state)
+
+    #Anomal Detection ran as a parallel branch of the pipeline
+    anomaly_result = state.get("anomaly_detection") or {}
+
+    #statics
+    insert_statistics(
+        filename,
+        state.get("audio_duration"),
+        state.get("Agent_rating"),
+        state.get("sentiment_score"),
+        anomaly_result.get("isAnomaly", False),
+        anomaly_result.get("reasons", [])
+    )
+    return state, build_file_response(state, emails)
+
+
+def resolve_incidents(states: Dict[str, State]) -> Dict[str, Optional[str]]:
+    """
+    Resolves the incident numbers of every processed file of a batch with one ServiceNow query,
+    and stores each file's INC -> sys_id map in its state so report uploads need no lookup.
+    Returns the map of the whole batch ({} when ServiceNow is not configured or reachable).
+    Blocking - meant to be run in a worker thread.
+    """
+    numbers = {filename: extract_inc_numbers(state) for filename, state in states.items()}
+    wanted = [number for file_numbers in numbers.values() for number in file_numbers]
+    if not wanted:
+        return {}
+
+    instance_url = os.getenv("SERVICENOW_INSTANCE_URL")
+    token = get_servicenow_access_token() if instance_url else None
+    if not token:
+        return {}
+    sys_ids = get_incident_sys_ids(instance_url, token, wanted)
+
+    for filename, file_numbers in numbers.items():
+        resolved = {number: sys_ids[number] for number in file_numbers if number in sys_ids}
+        if resolved:
+            call_state_store.put(filename, {**states[filename], "incident_sys_ids": resolved})
+    return sys_ids
+
+
+async def process_call_files(audio_paths: Dict[str, str], model_option: str, concurrency: int = PROCESS_CALLS_CONCURRENCY,
+                             incremental: bool = False, analysis_mode: str = "default"
+                             ) -> Tuple[Dict[str, FileProcessResponse], Dict[str, str], Dict[str, Optional[str]]]:
+    """
+    Processes several files concurrently off the event loop, at most `concurrency` at a time.
+    A failing file doesn't affect the others. Returns the responses of the processed files keyed by
+    filename, in the order of `audio_paths`, the error of every failed file, and the INC -> sys_id
+    map of every incident number found in the batch.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(filename: str, audio_path: str) -> Tuple[State, FileProcessResponse]:
+        async with semaphore:
+            return await asyncio.to_thread(process_call_file, filename, audio_path, model_option, None, incremental,
+                                           analysis_mode)
+
+    filenames: List[str] = list(audio_paths)
+    outcomes = await asyncio.gather(*(run(name, audio_paths[name]) for name in filenames), return_exceptions=True)
+
+    states, results, errors = {}, {}, {}
+    for name, outcome in zip(filenames, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Processing {name} failed: {outcome}")
+            errors[name] = str(outcome)
+        else:
+            states[name], results[name] = outcome
+    incidents = await asyncio.to_thread(resolve_incidents, states)
+    return results, errors, incidents
+
+
+async def stream_call_files(audio_paths: Dict[str, str], model_option: str,
+                            concurrency: int = PROCESS_CALLS_CONCURRENCY, incremental: bool = False,
+                            analysis_mode: str = "default") -> AsyncIterator[dict]:
+    """
+    Processes files like process_call_files but yields progress events as stages finish:
+    {"filename", "event", "data"}, ending each file with "file_result" (or "file_error")
+    and the whole batch with "incidents_resolved" (INC -> sys_id map) and "done".
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    states: Dict[str, State] = {}
+
+    def emit(filename: str, event: str, data: dict):
+        queue.put_nowait({"filename": filename, "event": event, "data": data})
+
+    async def run(filename: str, audio_path: str):
+        async with semaphore:
+            emit(filename, "started", {})
+            on_event = lambda event, data: loop.call_soon_threadsafe(emit, filename, event, data)
+            try:
+                state, response = await asyncio.to_thread(process_call_file, filename, audio_path, model_option, on_event,
+                                                          incremental, analysis_mode)
+                states[filename] = state
+                emit(filename, "file_result", response.model_dump())
+            except Exception as e:
+                print(f"Processing {filename} failed: {e}")
+                emit(filename, "file_error", {"error": str(e)})
+
+    tasks = [asyncio.create_task(run(name, path)) for name, path in audio_paths.items()]
+    all_done = asyncio.gather(*tasks)
+    all_done.add_done_callback(lambda _: queue.put_nowait(None))
+
+    while True:
+        event = await queue.get()
+        if event is None:
+            break
+        yield event
+    incidents = await asyncio.to_thread(resolve_incidents, states)
+    yield {"filename": None, "event": "incidents_resolved", "data": {"incidents": incidents}}
+    yield {"filename": None, "event": "done", "data": {"files": len(tasks)}}
@@ -3,19 +3,32 @@ from typing import List
 from core.models import State
 from io import BytesIO
 import io
-from core.llm import client 
+from core.llm import client, get_whisper_client
 from functools import lru_cache
 from langchain_groq import ChatGroq
 import re
 import json
 from langgraph.graph import StateGraph, END
 import os
-from openai import AzureOpenAI
 from azure.storage.blob import BlobServiceClient
 from typing import TypedDict, Optional,Any
 from pydantic import BaseModel,Field
 from langchain.prompts import ChatPromptTemplate
-from mutagen import File
+import threading
+from core.anomaly_detection import detect_anomalies
+from core.disk_cache import DiskCache
+from core.audio_split import should_split, transcribe_in_pieces
+from core.audio_download import blob_client_options, download_to_spool, probe_duration, release_spool
+from core.llm_cache import cached_invoke
+from core.llm_scheduler import llm_scheduler
+from core.sentiment import classify_segment_sentiments, WINDOWED_SENTIMENT_PROMPT_VERSION
+from core.summarize import get_summarize_text_prompt, clean_and_parse_json, summarize_transcript
+from core.summarize import SUMMARIZE_PROMPT_VERSION, SUMMARIZE_MAP_PROMPT_VERSION, SUMMARIZE_REDUCE_PROMPT_VERSION
+from core.anomaly_detection import ANOMALY_PROMPT_VERSION, ANOMALY_DEEP_REVIEW
+from core.anomaly_prescreen import PRESCREEN_VERSION
+from core.combined_analysis import analyze_call_combined, COMBINED_PROMPT_VERSION
+from core.local_sentiment import classify_segment_sentiments_local, LOCAL_SENTIMENT_VERSION
+import hashlib
 
 
 AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
@@ -23,50 +36,31 @@ AZURE_STORAGE_CONTAINER_NAME = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
 
 
 
-def extract_inc_number(state: dict) -> str | None:
-    """
-    Find 'INC' in state['call_summary'] and state['action_items'] and extract the digits that follow it.
-    """
-    def find_inc(text: str) -> str | None:
-        if not text:  # handle None or empty
-            return None
-
-        idx = text.find("INC")
-        if idx == -1:
-            return None
-
-        i = idx + 3  # move past 'INC'
+# The word 'INC', an optional "number"/"no."/"#" and a few separators, then at least 5 digits
+# (e.g. "INC0012345", "INC-0012345", "INC number 0012345"); "INCIDENT ... 3 May" or "Acme INC ... 2 days" don't match
+INC_PATTERN = re.compile(r"\bINC(?:\s*(?:number|no\.?))?[\s#:-]{0,3}(\d{5,})\b")
 
-        # Move forward until the first digit is found
-        while i < len(text) and not text[i].isdigit():
-            i += 1
 
-        # Collect continuous digits
-        digits = []
-        while i < len(text) and text[i].isdigit():
-            digits.append(text[i])
-            i += 1
-
-        if digits:
-            return "INC" + "".join(digits)
-        return None
+def extract_inc_numbers(state: dict) -> List[str]:
+    """
+    Every incident number mentioned in state['call_summary'], state['action_items'] and
+    state['transcription'], in that order and without duplicates.
+    """
+    texts = [state.get("call_summary") or ""]
+    for item in state.get("action_items") or []:
+        texts.extend(value for value in item.values() if isinstance(value, str))
+    texts.append(state.get("transcription") or "")
 
-    # Search in call_summary
-    call_summary = state.get("call_summary") or ""
-    inc = find_inc(call_summary)
-    if inc:
-        return inc
+    numbers = (f"INC{digits}" for text in texts for digits in INC_PATTERN.findall(text))
+    return list(dict.fromkeys(numbers))
 
-    # Search in action_items
-    action_items = state.get("action_items") or []
-    for item in action_items:
-        for value in item.values():
-            if isinstance(value, str):
-                inc = find_inc(value)
-                if inc:
-                    return inc
 
-    return None
+def extract_inc_number(state: dict) -> str | None:
+    """
+    The first incident number of extract_inc_numbers, or None.
+    """
+    numbers = extract_inc_numbers(state)
+    return numbers[0] if numbers else None
 
 
 def process_email_notifications(result: dict) -> List[str]:
@@ -286,14 +280,22 @@ def generate_pdf_report(filename: str,state: State) -> io.BytesIO:
     buffer.seek(0)
     return buffer
 
-# LLM loader with caching (only OpenAI and ChatGroq)
-@lru_cache(maxsize=1)
+# "<option>+LocalSentiment": segment sentiment from the local lexicon model, the LLM only for ambiguous segments
+LOCAL_SENTIMENT_SUFFIX = "+LocalSentiment"
+MODEL_OPTIONS = ["AzureOpenAI", "ChatGroq", "AzureOpenAI" + LOCAL_SENTIMENT_SUFFIX, "ChatGroq" + LOCAL_SENTIMENT_SUFFIX]
+# "default": one LLM request per stage, run in parallel branches; "combined": all stages from a single structured request
+ANALYSIS_MODES = ["default", "combined"]
+
+# LLM loader with caching (only OpenAI and ChatGroq) - one warm client per model option
+@lru_cache(maxsize=None)
 def load_llm(model_option: str):
+    if model_option.endswith(LOCAL_SENTIMENT_SUFFIX):
+        return load_llm(model_option[:-len(LOCAL_SENTIMENT_SUFFIX)])
     if model_option == "AzureOpenAI":
         return client
         #ChatOpenAI(model="gpt-4o-mini")
     elif model_option == "ChatGroq":
-        return ChatGroq(model_name="llama-3.3-70b-versatile")
+        return ChatGroq(model_name="llama-3.3-70b-versatile", max_retries=0)
     else:
         raise ValueError(f"Unsupported model option: {model_option}")
 
@@ -309,6 +311,15 @@ def clean_response(response_text: str) -> str:
         response_text = match.group(1).strip()
     return response_text
 
+# Bump a prompt version whenever its template changes, so cached LLM responses are not reused
+CALLOUTS_PROMPT_VERSION = "callouts-v1"
+
+def is_json_list(content: str) -> bool:
+    try:
+        return isinstance(json.loads(clean_response(content)), list)
+    except ValueError:
+        return False
+
 # Modify the analyze_call_chunks function
 def analyze_call_chunks(chunks):
     """
@@ -332,9 +343,8 @@ def analyze_call_chunks(chunks):
         ]
     )
         
-        chain = prompt | client
-        response = chain.invoke({"transcript": transcript})
-        response_text = clean_response(response.content)
+        response_text = clean_response(cached_invoke(prompt, client, {"transcript": transcript}, CALLOUTS_PROMPT_VERSION,
+                                                     is_valid=is_json_list))
         
         # Add robust JSON parsing
         try:
@@ -361,40 +371,32 @@ def analyze_call_chunks(chunks):
     except Exception as e:
         print(f"Analysis failed: {str(e)}")
         return []
-# === BATCH SENTIMENT ANALYSIS ===
-def get_batch_sentiment_prompt() -> ChatPromptTemplate:
-    return ChatPromptTemplate.from_messages([
-        ("system", "Analyze sentiment for these segments separated by '|'. Return JSON array of 'positive','neutral','negative' in order"),
-        ("human", "Segments: {segments}")
-    ])
 # Create processing pipeline per request
+# Nodes return only the keys they produce: sentiment, summarize and detect_anomaly
+# run in the same step after transcribe, so full-state returns would collide.
 
-def create_pipeline(llm) -> any:
+def create_pipeline(llm, analysis_mode: str = "default", local_sentiment: bool = False) -> any:
     def transcribe_node(state: State) -> State:
         result = transcribe_audio_openai(state["audio_path"])
 
-        transcription, segments, duration = result['text'], result.get('segments', []), result["duration"]
-        batch = get_batch_sentiment_prompt() | load_llm('AzureOpenAI')
-        resp = batch.invoke({'segments': ' | '.join([s.text for s in segments])})
-        try:
-            sentiments = json.loads(resp.content)
-        except:
-            sentiments = ['neutral'] * len(segments)
+        return {"transcription": result['text'], "segments": result.get('segments', []), "audio_duration": result["duration"],
+                "content_fingerprint": result.get("content_fingerprint")}
+
+    def sentiment_node(state: State) -> State:
+        segments = state.get("segments") or []
+        classify = classify_segment_sentiments_local if local_sentiment else classify_segment_sentiments
+        sentiments = classify([s["text"] for s in segments], load_llm('AzureOpenAI'))
         chunks = [
-            {'time_sec': round(s.start, 2), 'text': s.text.strip(), 'sentiment': sentiments[i] if i < len(sentiments) else 'neutral'}
+            {'time_sec': round(s["start"], 2), 'text': s["text"].strip(), 'sentiment': sentiments[i]}
             for i, s in enumerate(segments)
         ]
-        
-        return {**state, "transcription": transcription, "sentiment_chunks": chunks,"audio_duration":duration}
+        return {"sentiment_chunks": chunks}
 
     def summarize_node(state: State) -> State:
-        prompt = get_summarize_text_prompt()
-        chain = prompt | llm
-        response = chain.invoke({"transcription": state["transcription"]})
-        parsed = clean_and_parse_json(response.content)
+        segment_texts = [s["text"] for s in state.get("segments") or []]
+        parsed = summarize_transcript(state["transcription"], segment_texts, llm)
         if parsed:
             return {
-                **state,
                 "call_summary": parsed.get("summary", "No summary available."),
                 "sentiment": parsed.get("sentiment", "Not detected"),
                 "sentiment_score": parsed.get("sentiment_score", 0),
@@ -405,7 +407,7 @@ def create_pipeline(llm) -> any:
                 "Customer_name": parsed.get("Customer_name", "Not detected"),
                 "Agent_name": parsed.get("Agent_name", "Not detected")
             }
-        return {**state, "call_summary": "Error parsing response.", "sentiment": "", "sentiment_score": 0,
+        return {"call_summary": "Error parsing response.", "sentiment": "", "sentiment_score": 0,
                 "call_purpose": "", "speaker_insights": None, "action_items": None,"Agent_rating": 0,"Customer_name":"", "Agent_name":""}
 
     def analyze_callouts_node(state: State) -> State:
@@ -429,29 +431,166 @@ def create_pipeline(llm) -> any:
                 print(f"Skipping invalid item: {e}")
         
         #print(f"Validated callouts: {validated}")
-        return {**state, "call_outs": validated}
+        return {"call_outs": validated}
+
+    def detect_anomaly_node(state: State) -> State:
+        return {"anomaly_detection": detect_anomalies(state.get("transcription") or "", deep_review=ANOMALY_DEEP_REVIEW)}
+
+    def combined_node(state: State) -> State:
+        segments = state.get("segments") or []
+        result = analyze_call_combined(segments, llm)
+        if result:
+            return result
+        return {"call_summary": "Error parsing response.", "sentiment": "", "sentiment_score": 0,
+                "call_purpose": "", "speaker_insights": None, "action_items": None, "Agent_rating": 0, "Customer_name": "",
+                "Agent_name": "", "sentiment_chunks": [], "call_outs": [], "anomaly_detection": None}
 
-    # Build graph with VERBOSE connection logging
     graph = StateGraph(State)
     graph.add_node("transcribe", transcribe_node)
+    graph.set_entry_point("transcribe")
+
+    # Combined mode: a single structured request produces every stage's output after transcription
+    if analysis_mode == "combined":
+        graph.add_node("combined", combined_node)
+        graph.add_edge("transcribe", "combined")
+        graph.add_edge("combined", END)
+        return graph.compile()
+
+    # Build graph: transcribe, then fan out the independent LLM stages in parallel
+    # (call-outs need the sentiment chunks, so they follow sentiment on the same branch).
+    # invoke() returns once every branch has reached END.
+    graph.add_node("sentiment", sentiment_node)
     graph.add_node("summarize", summarize_node)
     graph.add_node("analyze_callouts", analyze_callouts_node)
-    
-    #print("\n=== GRAPH CONNECTIONS ===")
-    graph.add_edge("transcribe", "summarize")
-    #print("Connected transcribe → summarize")
-    graph.add_edge("summarize", "analyze_callouts")
-    #print("Connected summarize → analyze_callouts")
-    graph.add_edge("analyze_callouts", END)
-    #print("Connected analyze_callouts → END")
-    
-    graph.set_entry_point("transcribe")
+    graph.add_node("detect_anomaly", detect_anomaly_node)
+
+    for branch in ("sentiment", "summarize", "detect_anomaly"):
+        graph.add_edge("transcribe", branch)
+    graph.add_edge("sentiment", "analyze_callouts")
+    for last in ("summarize", "analyze_callouts", "detect_anomaly"):
+        graph.add_edge(last, END)
     return graph.compile()
 
-@lru_cache(maxsize=100)
+# Compiled pipelines, one per (model option, analysis mode), shared by every request and worker thread
+_pipelines: dict = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_pipeline(model_option: str, analysis_mode: str = "default"):
+    """
+    Returns the compiled pipeline for a model option and analysis mode, compiling it on first use.
+    Raises ValueError for unsupported model options or analysis modes.
+    """
+    key = (model_option, analysis_mode)
+    pipeline = _pipelines.get(key)
+    if pipeline is None:
+        if analysis_mode not in ANALYSIS_MODES:
+            raise ValueError(f"Unsupported analysis mode: {analysis_mode}")
+        with _pipelines_lock:
+            pipeline = _pipelines.get(key)
+            if pipeline is None:
+                pipeline = create_pipeline(load_llm(model_option), analysis_mode,
+                                           model_option.endswith(LOCAL_SENTIMENT_SUFFIX))
+                _pipelines[key] = pipeline
+    return pipeline
+
+
+def get_pipeline_version(analysis_mode: str = "default", local_sentiment: bool = False) -> str:
+    """
+    Identifies what the pipeline would produce: the Whisper deployment and every stage's prompt version.
+    Changing any prompt version makes previously stored results stale for incremental runs.
+    """
+    if analysis_mode == "combined":
+        parts = [WHISPER_DEPLOYMENT, COMBINED_PROMPT_VERSION]
+    else:
+        parts = [
+            WHISPER_DEPLOYMENT, WINDOWED_SENTIMENT_PROMPT_VERSION, SUMMARIZE_PROMPT_VERSION, SUMMARIZE_MAP_PROMPT_VERSION,
+            SUMMARIZE_REDUCE_PROMPT_VERSION, CALLOUTS_PROMPT_VERSION, ANOMALY_PROMPT_VERSION,
+        ]
+        if local_sentiment:
+            parts.append(LOCAL_SENTIMENT_VERSION)
+        if not ANOMALY_DEEP_REVIEW:
+            parts.append(PRESCREEN_VERSION)
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def processing_fingerprint(content_fingerprint: str, model_option: str, analysis_mode: str = "default") -> str:
+    """
+    Fingerprint of one processing run: the blob's content (MD5/ETag), the model option, the analysis mode
+    and the pipeline version.
+    """
+    version = get_pipeline_version(analysis_mode, model_option.endswith(LOCAL_SENTIMENT_SUFFIX))
+    return f"{content_fingerprint}|{model_option}|{analysis_mode}|{version}"
+
+
+def get_processing_fingerprint(audio_file_path: str, model_option: str, analysis_mode: str = "default") -> str:
+    """processing_fingerprint of the blob as it is now (one blob-properties request)."""
+    properties = get_audio_blob_client(audio_file_path).get_blob_properties()
+    return processing_fingerprint(get_blob_fingerprint(properties), model_option, analysis_mode)
+
+
+def warm_pipelines():
+    """
+    Compiles the pipeline (and loads the client) of every model option and analysis mode; used at startup.
+    """
+    for model_option in MODEL_OPTIONS:
+        for analysis_mode in ANALYSIS_MODES:
+            try:
+                get_pipeline(model_option, analysis_mode)
+            except Exception as e:
+                print(f"Warning: could not warm {analysis_mode} pipeline for {model_option}: {e}")
+
+
+# Whisper results shared by every worker on the host, keyed by the blob content (MD5 or ETag)
+transcription_cache = DiskCache(
+    "transcriptions",
+    max_bytes=int(os.getenv("TRANSCRIPTION_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
+WHISPER_DEPLOYMENT = "whispernew"
+
+
+def get_audio_blob_client(audio_file_path: str):
+    blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING, **blob_client_options())
+    container_client = blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
+    return container_client.get_blob_client(audio_file_path)
+
+
+def get_blob_fingerprint(properties) -> str:
+    """
+    Content fingerprint of a blob from its properties: its Content-MD5 when set, otherwise
+    its ETag (which changes whenever the blob is overwritten).
+    """
+    content_md5 = properties.content_settings.content_md5
+    if content_md5:
+        return "md5:" + bytes(content_md5).hex()
+    return "etag:" + properties.etag.strip('"')
+
+
+def whisper_transcribe(client, audio_file, filename: str = "audio.mp3") -> dict:
+    """Single Whisper request through the scheduler; returns {"text", "segments"} with plain-dict segments."""
+    def call():
+        audio_file.seek(0)  # a throttled attempt may have consumed the stream
+        return client.audio.transcriptions.create(
+            model=WHISPER_DEPLOYMENT,
+            file=(filename, audio_file),
+            response_format="verbose_json"
+        )
+
+    transcription = llm_scheduler.run(WHISPER_DEPLOYMENT, 0, call)
+    return {
+        "text": transcription.text,         # full transcription
+        "segments": [                       # sentence-level timestamps from Whisper
+            {"start": float(s.start), "end": float(s.end), "text": s.text}
+            for s in (transcription.segments or [])
+        ],
+    }
+
+
 def transcribe_audio_openai(audio_file_path: str) -> dict:
     """
     Transcribes the audio file using Azure OpenAI Whisper and returns both full text and segments with timestamps.
+    Long or large recordings are cut at silences and the pieces transcribed in parallel.
+    Results are served from transcription_cache when the same audio content was transcribed before.
     Returns:
         {
             "text": str,
@@ -459,72 +598,38 @@ def transcribe_audio_openai(audio_file_path: str) -> dict:
                 "start": float,
                 "end": float,
                 "text": str
-            }
+            },
+            "duration": int,
+            "content_fingerprint": str  # get_blob_fingerprint of the transcribed blob
         }
     """
-    client = AzureOpenAI(
-        api_key=os.getenv("OPENAI_KEY_W"),  
-        api_version="2024-02-01",
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT_W")
-    )
-    deployment_id = "whispernew"
-    
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-        container_client = blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
-        blob_client = container_client.get_blob_client(audio_file_path)
-
-        download_stream = blob_client.download_blob()
-        audio_stream = BytesIO(download_stream.readall())
-        audio_stream.name = "audio.mp3" 
-        transcription = client.audio.transcriptions.create(
-            model=deployment_id,
-            file=audio_stream,
-            response_format="verbose_json"
-        ) 
-         
-        audio_stream.seek(0)
-        # auto-detect format (mp3, wav, flac, ogg, etc.)
-        audio = File(audio_stream)
-
-        if audio is not None and audio.info is not None:
-            duration_seconds = int(audio.info.length)
-        else:
-            duration_seconds = 0
-        return {
-            "text": transcription.text,         # full transcription
-            "segments": transcription.segments,  # sentence-level timestamps from Whisper
-            "duration":duration_seconds
-        }
-
-    except Exception as e:
-        raise Exception(f"Error transcribing audio: {str(e)}")
+        blob_client = get_audio_blob_client(audio_file_path)
+        properties = blob_client.get_blob_properties()
+        content_fingerprint = get_blob_fingerprint(properties)
+        cache_key = f"{WHISPER_DEPLOYMENT}:{content_fingerprint}"
+        cached = transcription_cache.get(cache_key)
+        if cached is not None:
+            return {**cached, "content_fingerprint": content_fingerprint}
 
+        client = get_whisper_client()
 
-# Prompt for summarization
-def get_summarize_text_prompt() -> ChatPromptTemplate:
-    systemContent = '''
-You are an assistant that generates concise, insightful, and professional call summaries in JSON format. Your task is to analyze the provided transcription and extract key details with a specific focus on capturing not only the literal words but also the underlying tone, emotional nuances, and customer sentiment such as frustration, annoyance, and any other subtle emotional indicators. Ensure that your analysis is based on both the textual content and the overall call context.
-
-The JSON output must include the following fields without any change in their format:
+        audio_stream = download_to_spool(blob_client)
+        try:
+            duration_seconds = probe_duration(audio_stream)
 
-- "summary": A concise summary of the call, capturing all key points discussed.
-- "sentiment": An aspect-based sentiment analysis narrative that integrates tone and emotional indicators, including but not limited to frustration, calmness, or enthusiasm. This should encompass both explicit language cues and contextual interpretations.
-- "sentiment_score": A numeric integer overall sentiment score (1-10) that reflects the cumulative sentiment of the call, factoring in words used, tone, and emotional nuances.
-- "call_purpose": The main objective of the call, derived from the discussion.
-- "speaker_insights": A dictionary with two keys, "Customer" and "Agent". Each key should have a descriptive string insight that captures not only what was spoken, but also the inferred emotional state (e.g., customer tone, frustration, annoyance; agent's tone, empathy, professionalism) observed during the call. Use both direct content and overall call dynamics to inform your insights.
-- "Agent_rating": Based upon the conversation and speaker insights, rate the performance of Agent out of 10, for example if he talks nicely, behave properly give him rating 8-10,if his tone was not appropriate, he didnt show empathy to the customer in such scenarios give him ratings below 4. Use your intelligence to observe agent performance and rate him out of 10."
-- "Customer_name": Based upon the conversation fetch Customer Name. if Customer name is not mentioned then return NA."
-- "Agent_name": Based upon the conversation fetch Agent Name. if Agent name is not mentioned then return NA."
-- "action_items": A list of follow-up action items that has been discussed during the call, that need to undertaken by the Agent in the future in following format:
-  [{{"task"}}: "<description>"]
+            if should_split(properties.size, duration_seconds):
+                result = transcribe_in_pieces(audio_stream, lambda piece: whisper_transcribe(client, piece, piece.name))
+            else:
+                result = {**whisper_transcribe(client, audio_stream), "duration": duration_seconds}
+        finally:
+            release_spool(audio_stream)
 
-Here is the transcription: "{transcription}"
+        transcription_cache.set(cache_key, result)
+        return {**result, "content_fingerprint": content_fingerprint}
 
-Return the response in JSON format only, without any extra text.
-'''
-    messages = [("system", systemContent), ("human", "{transcription}")]
-    return ChatPromptTemplate.from_messages(messages)
+    except Exception as e:
+        raise Exception(f"Error transcribing audio: {str(e)}")
 
 
 def get_sentiment_prompt_template() -> ChatPromptTemplate:
@@ -538,14 +643,3 @@ def get_sentiment_prompt_template() -> ChatPromptTemplate:
     human_content = 'Segment: "{segment_text}"'
     messages = [("system", system_content), ("human", human_content)]
     return ChatPromptTemplate.from_messages(messages)
-
-
-# JSON cleaning utility
-def clean_and_parse_json(response_text: str) -> Optional[dict]:
-    try:
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group(0))
-        return None
-    except json.JSONDecodeError:
-        return None
@@ -0,0 +1,118 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Optional
+from core.report import generate_pdf_report
+from core.state_store import call_state_store
+
+# Processes rendering PDFs for bulk exports (shared by every export of this worker)
+REPORT_EXPORT_WORKERS = int(os.getenv("REPORT_EXPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Reports rendered or waiting to be zipped at any time per export; bounds memory whatever the export size
+REPORT_EXPORT_MAX_IN_FLIGHT = int(os.getenv("REPORT_EXPORT_MAX_IN_FLIGHT", str(REPORT_EXPORT_WORKERS * 2)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: the API worker runs background threads (outbox, token refresh, to_thread pool)
+            # whose locks a forked child could inherit in a held state
+            _pool = ProcessPoolExecutor(max_workers=REPORT_EXPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool(broken: ProcessPoolExecutor):
+    """Drops a pool whose worker died, so the next export starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+
+
+def _render_report(filename: str, state: dict) -> bytes:
+    return generate_pdf_report(filename, state).getvalue()
+
+
+class _ZipStream:
+    """
+    Write-only, non-seekable sink for ZipFile: the archive is written sequentially
+    (sizes go in data descriptors) and every chunk is handed out once with drain().
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_report_zip(filenames: List[str]) -> Iterator[bytes]:
+    """
+    Renders the report of every processed call in a process pool and yields a ZIP archive of them,
+    chunk by chunk, in the order the reports finish. At most REPORT_EXPORT_MAX_IN_FLIGHT states/PDFs
+    are held at once. Calls without a stored state or whose report failed are listed in errors.json.
+    """
+    pool = _get_pool()
+    sink = _ZipStream()
+    pending_names = iter(dict.fromkeys(filenames))
+    in_flight = {}
+    errors = {}
+    exported = 0
+
+    def submit_next() -> bool:
+        for filename in pending_names:
+            state = call_state_store.get(filename)
+            if not state:
+                errors[filename] = "No processed call available"
+                continue
+            in_flight[pool.submit(_render_report, filename, state)] = filename
+            return True
+        return False
+
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            while len(in_flight) < REPORT_EXPORT_MAX_IN_FLIGHT and submit_next():
+                pass
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    filename = in_flight.pop(future)
+                    submit_next()  # keep the pool busy while this report is zipped
+                    try:
+                        pdf = future.result()
+                    except BrokenProcessPool:
+                        _reset_pool(pool)
+                        raise
+                    except Exception as e:
+                        errors[filename] = str(e)
+                        continue
+                    # PDFs are already compressed, so they are stored as is
+                    info = zipfile.ZipInfo(f"Call_Summary_{filename}.pdf", date_time=time.localtime()[:6])
+                    archive.writestr(info, pdf)
+                    exported += 1
+                    yield sink.drain()
+            if errors:
+                archive.writestr("errors.json", json.dumps(errors, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+        print(f"Report export: {exported} reports zipped, {len(errors)} failed")
+        yield sink.drain()
+    finally:
+        # Client went away (or the export failed): don't render reports nobody will receive
+        for future in in_flight:
+            future.cancel()
@@ -0,0 +1,214 @@
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+from core.blob import upload_pdf_to_blob
+from core.disk_cache import CACHE_DIR
+from core.servicenow import (IncidentLookupError, SERVICENOW_CONNECT_TIMEOUT_SECONDS, SERVICENOW_MAX_REQUESTS_PER_UPLOAD,
+                             SERVICENOW_READ_TIMEOUT_SECONDS, get_servicenow_access_token, get_servicenow_uploader,
+                             lookup_incident_sys_id)
+
+# Report uploads (ServiceNow attachment or Blob fallback) queued by /download-report and delivered in the background.
+# The outbox is a SQLite file on the host, so queued uploads survive restarts and are shared by every worker.
+REPORT_OUTBOX_PATH = os.getenv("REPORT_OUTBOX_PATH", os.path.join(CACHE_DIR, "report_outbox.sqlite3"))
+REPORT_OUTBOX_MAX_ATTEMPTS = int(os.getenv("REPORT_OUTBOX_MAX_ATTEMPTS", "6"))
+REPORT_OUTBOX_POLL_SECONDS = float(os.getenv("REPORT_OUTBOX_POLL_SECONDS", "2"))
+REPORT_OUTBOX_RETENTION_DAYS = int(os.getenv("REPORT_OUTBOX_RETENTION_DAYS", "7"))
+# Time allowed for the Azure Blob fallback of a report: two bounded operations (create_container, upload_blob),
+# see BLOB_RETRY_TOTAL in core.blob
+REPORT_OUTBOX_BLOB_UPLOAD_SECONDS = 600
+# An upload claimed by a worker that died is handed out again after this long - more than the slowest delivery
+# (every ServiceNow request timing out, then the Blob fallback), so a live worker never loses its claim
+REPORT_OUTBOX_LEASE_SECONDS = (SERVICENOW_MAX_REQUESTS_PER_UPLOAD
+                               * (SERVICENOW_CONNECT_TIMEOUT_SECONDS + SERVICENOW_READ_TIMEOUT_SECONDS)
+                               + REPORT_OUTBOX_BLOB_UPLOAD_SECONDS)
+
+
+class RetryableUploadError(Exception):
+    pass
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(REPORT_OUTBOX_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:  # commit on success, rollback on error
+            yield conn
+    finally:
+        conn.close()
+
+
+def _init_db():
+    os.makedirs(os.path.dirname(REPORT_OUTBOX_PATH), exist_ok=True)
+    with _connect() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " id TEXT PRIMARY KEY, filename TEXT NOT NULL, inc_number TEXT, sys_id TEXT, pdf BLOB,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL,"
+            " result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_due ON uploads (status, next_attempt_at)")
+
+
+def enqueue_report_upload(filename: str, pdf: bytes, inc_number: Optional[str] = None,
+                          sys_id: Optional[str] = None) -> str:
+    """
+    Stores the report upload in the outbox and returns its id; the worker delivers it in the background.
+    `sys_id` is the incident's sys_id when already known (saves the lookup).
+    """
+    upload_id = uuid.uuid4().hex
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO uploads (id, filename, inc_number, sys_id, pdf, status, next_attempt_at, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (upload_id, filename, inc_number, sys_id, pdf, now, now, now),
+        )
+    start_outbox_worker()
+    return upload_id
+
+
+def get_report_upload(upload_id: str) -> Optional[dict]:
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT id, filename, inc_number, status, attempts, result, error, created_at, updated_at"
+            " FROM uploads WHERE id = ?", (upload_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    upload = dict(row)
+    upload["result"] = json.loads(upload["result"]) if upload["result"] else None
+    return upload
+
+
+def deliver_report(filename: str, pdf: bytes, inc_number: Optional[str], sys_id: Optional[str]) -> dict:
+    """
+    Uploads a report like /download-report used to: to the incident in ServiceNow, or to Blob Storage when
+    there is no INC, no ServiceNow configuration or no such incident. Raises RetryableUploadError on failures
+    worth retrying.
+    """
+    report_name = f"Call_Summary_{filename}.pdf"
+    if not inc_number:
+        print("No INC found, uploading to Azure Blob Storage...")
+        blob_url = upload_pdf_to_blob(io.BytesIO(pdf), report_name, prefix="no-inc")
+        return {"uploaded_to": "azure_blob", "blob_url": blob_url}
+
+    uploader = get_servicenow_uploader()
+    if uploader is None:
+        print("Missing ServiceNow config. Uploading to Azure Blob Storage...")
+        blob_url = upload_pdf_to_blob(io.BytesIO(pdf), report_name, prefix="no-servicenow")
+        return {"uploaded_to": "azure_blob", "blob_url": blob_url}
+
+    token = get_servicenow_access_token()
+    if not token:
+        raise RetryableUploadError("Could not get a ServiceNow access token")
+    if not sys_id:
+        try:
+            sys_id = lookup_incident_sys_id(uploader.instance_url, token, inc_number)
+        except IncidentLookupError as e:
+            # ServiceNow slow or failing: retry later rather than filing the report as "incident not found"
+            raise RetryableUploadError(str(e)) from e
+    if not sys_id:
+        print(f"Incident {inc_number} not found. Uploading to Azure Blob Storage...")
+        blob_url = upload_pdf_to_blob(io.BytesIO(pdf), report_name, prefix="incident-not-found")
+        return {"uploaded_to": "azure_blob", "blob_url": blob_url}
+
+    result = uploader.upload_pdf_to_incident(sys_id, pdf, custom_filename=report_name)
+    if isinstance(result, dict) and result.get("error") == "incident not found.":
+        blob_url = upload_pdf_to_blob(io.BytesIO(pdf), report_name, prefix="incident-not-found")
+        return {"uploaded_to": "azure_blob", "blob_url": blob_url}
+    if isinstance(result, dict) and result.get("error"):
+        raise RetryableUploadError(result["error"])
+    return {"uploaded_to": "servicenow", "incident_number": inc_number, "result": result}
+
+
+def _claim_next(conn) -> Optional[sqlite3.Row]:
+    """Claims the oldest due upload (or one whose lease expired) for this worker."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")  # take the write lock first, so two workers can't claim the same upload
+    row = conn.execute(
+        "SELECT id, filename, inc_number, sys_id, pdf, attempts FROM uploads"
+        " WHERE (status = 'queued' AND next_attempt_at <= ?) OR (status = 'uploading' AND next_attempt_at <= ?)"
+        " ORDER BY next_attempt_at LIMIT 1", (now, now),
+    ).fetchone()
+    if row is None:
+        return None
+    claimed = conn.execute(
+        "UPDATE uploads SET status = 'uploading', next_attempt_at = ?, updated_at = ?"
+        " WHERE id = ? AND next_attempt_at <= ?", (now + REPORT_OUTBOX_LEASE_SECONDS, now, row["id"], now),
+    ).rowcount
+    return row if claimed else None
+
+
+def _process_one() -> bool:
+    """Delivers one due upload; returns False when nothing was due."""
+    with _connect() as conn:
+        row = _claim_next(conn)
+    if row is None:
+        return False
+
+    attempts = row["attempts"] + 1
+    try:
+        result = deliver_report(row["filename"], row["pdf"], row["inc_number"], row["sys_id"])
+    except Exception as e:
+        now = time.time()
+        failed = attempts >= REPORT_OUTBOX_MAX_ATTEMPTS
+        print(f"Report upload {row['id']} attempt {attempts} failed: {e}")
+        with _connect() as conn:
+            conn.execute(
+                "UPDATE uploads SET status = ?, attempts = ?, error = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                ("failed" if failed else "queued", attempts, str(e), now + min(600, 5 * 2 ** attempts), now, row["id"]),
+            )
+        return True
+
+    now = time.time()
+    with _connect() as conn:
+        # The PDF is no longer needed once delivered
+        conn.execute(
+            "UPDATE uploads SET status = 'completed', attempts = ?, result = ?, error = NULL, pdf = NULL, updated_at = ?"
+            " WHERE id = ?", (attempts, json.dumps(result, default=str), now, row["id"]),
+        )
+    return True
+
+
+def _purge_old():
+    cutoff = time.time() - REPORT_OUTBOX_RETENTION_DAYS * 86400
+    with _connect() as conn:
+        conn.execute("DELETE FROM uploads WHERE status IN ('completed', 'failed') AND updated_at < ?", (cutoff,))
+
+
+def _worker_loop():
+    last_purge = 0.0
+    while True:
+        try:
+            if time.time() - last_purge > 3600:
+                _purge_old()
+                last_purge = time.time()
+            if not _process_one():
+                time.sleep(REPORT_OUTBOX_POLL_SECONDS)
+        except Exception as e:
+            print(f"Report outbox worker error: {e}")
+            time.sleep(REPORT_OUTBOX_POLL_SECONDS)
+
+
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+def start_outbox_worker():
+    """Starts this process's outbox worker thread once; safe to call repeatedly."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_worker_loop, daemon=True, name="report-outbox")
+            _worker.start()
+
+
+_init_db()
@@ -0,0 +1,110 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from langchain_core.prompts import ChatPromptTemplate
+from core.llm_cache import cached_invoke
+
+# Approximate prompt tokens of segment text sent per request
+SENTIMENT_WINDOW_TOKENS = int(os.getenv("SENTIMENT_WINDOW_TOKENS", "1500"))
+SENTIMENT_MAX_WORKERS = int(os.getenv("SENTIMENT_MAX_WORKERS", "4"))
+SENTIMENT_MAX_RETRIES = int(os.getenv("SENTIMENT_MAX_RETRIES", "2"))
+WINDOWED_SENTIMENT_PROMPT_VERSION = "windowed-sentiment-v1"
+
+SENTIMENT_LABELS = ("positive", "neutral", "negative")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def get_windowed_sentiment_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages([
+        ("system", "Classify the sentiment of each numbered call segment as 'positive', 'neutral' or 'negative'. "
+                   "Return only a JSON object mapping every segment number to its label, "
+                   "e.g. {{\"0\": \"neutral\", \"1\": \"negative\"}}"),
+        ("human", "Segments:\n{segments}")
+    ])
+
+
+def build_windows(texts: List[str], budget: int = SENTIMENT_WINDOW_TOKENS) -> List[List[int]]:
+    """
+    Groups consecutive segment indexes into windows whose estimated size stays within `budget` tokens.
+    A single segment larger than the budget gets a window of its own.
+    """
+    windows, current, used = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text) + 4  # index prefix and separators
+        if current and used + tokens > budget:
+            windows.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += tokens
+    if current:
+        windows.append(current)
+    return windows
+
+
+def parse_window_labels(response_text: str, indexes: List[int]) -> Dict[int, str]:
+    """Returns the valid labels found in the response, keyed by segment index."""
+    match = re.search(r'\{.*\}', response_text or "", re.DOTALL)
+    if not match:
+        return {}
+    try:
+        parsed = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    wanted = set(indexes)
+    labels = {}
+    for key, label in parsed.items() if isinstance(parsed, dict) else []:
+        try:
+            i = int(key)
+        except (TypeError, ValueError):
+            continue
+        label = str(label).strip().lower()
+        if i in wanted and label in SENTIMENT_LABELS:
+            labels[i] = label
+    return labels
+
+
+def _classify_window(llm, texts: List[str], indexes: List[int]) -> Dict[int, str]:
+    segments = "\n".join(f"[{i}] {json.dumps(texts[i], ensure_ascii=False)}" for i in indexes)
+    try:
+        response = cached_invoke(
+            get_windowed_sentiment_prompt(), llm, {"segments": segments}, WINDOWED_SENTIMENT_PROMPT_VERSION,
+            is_valid=lambda content: len(parse_window_labels(content, indexes)) == len(indexes)
+        )
+    except Exception as e:
+        print(f"Sentiment window failed: {e}")
+        return {}
+    return parse_window_labels(response, indexes)
+
+
+def classify_segment_sentiments(texts: List[str], llm) -> List[str]:
+    """
+    Labels every segment text as positive/neutral/negative.
+    Segments are sent with explicit indexes in token-budgeted windows that run concurrently;
+    results are aligned by index and only the segments of failed windows are retried.
+    Segments still unlabelled after the retries default to 'neutral'.
+    """
+    labels: Dict[int, str] = {}
+    pending = build_windows(texts)
+
+    with ThreadPoolExecutor(max_workers=SENTIMENT_MAX_WORKERS) as executor:
+        for attempt in range(SENTIMENT_MAX_RETRIES + 1):
+            if not pending:
+                break
+            results = list(executor.map(lambda window: _classify_window(llm, texts, window), pending))
+            retry = []
+            for window, window_labels in zip(pending, results):
+                labels.update(window_labels)
+                missing = [i for i in window if i not in window_labels]
+                if missing:
+                    retry.append(missing)
+            if retry and attempt < SENTIMENT_MAX_RETRIES:
+                print(f"Retrying {len(retry)} sentiment window(s)")
+            pending = retry
+
+    return [labels.get(i, "neutral") for i in range(len(texts))]
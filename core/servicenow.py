@@ -1,16 +1,224 @@
 import requests
+import asyncio
+import httpx
 import os
+import threading
+import time
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse, parse_qs
 import json
+from typing import AsyncIterable, BinaryIO, Dict, List, Optional, Tuple, Union
+
+# Refresh the OAuth token in the background once it is this close to expiring
+SERVICENOW_TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("SERVICENOW_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# Stop handing out a token this close to its expiry (callers then wait for the refresh)
+SERVICENOW_TOKEN_MIN_VALIDITY_SECONDS = 15
+SERVICENOW_TOKEN_DEFAULT_EXPIRES_IN = 1800
+
+# INC -> sys_id lookups: found incidents are cached for the TTL, "not found" for the shorter negative TTL
+INCIDENT_CACHE_TTL_SECONDS = int(os.getenv("INCIDENT_CACHE_TTL_SECONDS", "3600"))
+INCIDENT_CACHE_NEGATIVE_TTL_SECONDS = int(os.getenv("INCIDENT_CACHE_NEGATIVE_TTL_SECONDS", "120"))
+INCIDENT_CACHE_MAX_ENTRIES = int(os.getenv("INCIDENT_CACHE_MAX_ENTRIES", "10000"))
+SERVICENOW_POOL_CONNECTIONS = int(os.getenv("SERVICENOW_POOL_CONNECTIONS", "20"))
+# (connect, read) timeout of every ServiceNow request, so a stalled instance can't hold a worker indefinitely
+SERVICENOW_CONNECT_TIMEOUT_SECONDS = float(os.getenv("SERVICENOW_CONNECT_TIMEOUT_SECONDS", "10"))
+SERVICENOW_READ_TIMEOUT_SECONDS = float(os.getenv("SERVICENOW_READ_TIMEOUT_SECONDS", "60"))
+SERVICENOW_TIMEOUT = (SERVICENOW_CONNECT_TIMEOUT_SECONDS, SERVICENOW_READ_TIMEOUT_SECONDS)
+# Most requests one report upload can make: token (again after a 401), incident lookup, attachment upload
+# (again after a 401) and the incident check after a 404 (again after a 401)
+SERVICENOW_MAX_REQUESTS_PER_UPLOAD = 7
+
+
+def _pooled_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=SERVICENOW_POOL_CONNECTIONS, pool_maxsize=SERVICENOW_POOL_CONNECTIONS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Keep-alive connections shared by the incident lookups and token requests of the process
+http_session = _pooled_session()
+
+
+class IncidentLookupCache:
+    """
+    In-process TTL cache of INC number -> sys_id shared by every route, with negative caching
+    ("not found" is stored as None for INCIDENT_CACHE_NEGATIVE_TTL_SECONDS) and LRU eviction.
+    """
+
+    def __init__(self, ttl_seconds: int, negative_ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "negative_hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, inc_number: str) -> Tuple[bool, Optional[str]]:
+        """(True, sys_id or None) when a live entry exists, (False, None) otherwise."""
+        with self._lock:
+            entry = self._entries.get(inc_number)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(inc_number)
+                self._counters["hits" if entry[0] else "negative_hits"] += 1
+                return True, entry[0]
+            if entry is not None:
+                del self._entries[inc_number]
+            self._counters["misses"] += 1
+            return False, None
+
+    def set(self, inc_number: str, sys_id: Optional[str]):
+        ttl = self.ttl_seconds if sys_id else self.negative_ttl_seconds
+        with self._lock:
+            self._entries[inc_number] = (sys_id, time.monotonic() + ttl)
+            self._entries.move_to_end(inc_number)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_sys_id(self, sys_id: str):
+        """Drops the entries pointing to a sys_id, e.g. after an upload to it returned 404."""
+        with self._lock:
+            stale = [number for number, (cached, _) in self._entries.items() if cached == sys_id]
+            for number in stale:
+                del self._entries[number]
+            self._counters["invalidations"] += len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters["hits"] + counters["negative_hits"] + counters["misses"]
+        hit_rate = (counters["hits"] + counters["negative_hits"]) / lookups if lookups else None
+        return {**counters, "hit_rate": hit_rate, "entries": entries, "max_entries": self.max_entries}
+
+
+incident_cache = IncidentLookupCache(INCIDENT_CACHE_TTL_SECONDS, INCIDENT_CACHE_NEGATIVE_TTL_SECONDS,
+                                     INCIDENT_CACHE_MAX_ENTRIES)
+
+
+class ServiceNowTokenManager:
+    """
+    Process-wide cache of the ServiceNow OAuth token.
+    The token is reused until SERVICENOW_TOKEN_REFRESH_MARGIN_SECONDS (at most half its lifetime) before
+    `expires_in`; from then on one background refresh runs while callers keep using the current token.
+    Without a usable token, callers wait for a single in-flight refresh instead of each requesting their
+    own (single-flight).
+    """
+
+    def __init__(self, fetch_token):
+        self._fetch_token = fetch_token  # () -> token response dict or None
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_margin = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._background_refresh = False
+
+    def _fresh(self, now: float) -> bool:
+        return self._token is not None and now < self._expires_at - self._refresh_margin
+
+    def _usable(self, now: float) -> bool:
+        return self._token is not None and now < self._expires_at - SERVICENOW_TOKEN_MIN_VALIDITY_SECONDS
+
+    def _refresh(self) -> Optional[str]:
+        with self._refresh_lock:
+            with self._lock:
+                if self._fresh(time.monotonic()):
+                    return self._token  # refreshed by another caller meanwhile
+            response = self._fetch_token()
+            with self._lock:
+                if response and response.get("access_token"):
+                    self._token = response["access_token"]
+                    expires_in = int(response.get("expires_in") or SERVICENOW_TOKEN_DEFAULT_EXPIRES_IN)
+                    self._expires_at = time.monotonic() + expires_in
+                    # Short-lived tokens (expires_in under twice the margin) are refreshed halfway, not on every call
+                    self._refresh_margin = min(SERVICENOW_TOKEN_REFRESH_MARGIN_SECONDS, expires_in / 2)
+                elif not self._usable(time.monotonic()):
+                    self._token = None
+                return self._token if self._usable(time.monotonic()) else None
+
+    def _refresh_in_background(self):
+        try:
+            self._refresh()
+        finally:
+            with self._lock:
+                self._background_refresh = False
+
+    def get_token(self) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            if self._fresh(now):
+                return self._token
+            if self._usable(now):
+                if not self._background_refresh:
+                    self._background_refresh = True
+                    threading.Thread(target=self._refresh_in_background, daemon=True,
+                                     name="servicenow-token-refresh").start()
+                return self._token
+        return self._refresh()
+
+    def invalidate(self, token: str):
+        """Drops `token` (e.g. after a 401) unless it was already replaced by a newer one."""
+        with self._lock:
+            if self._token == token:
+                self._token = None
+                self._expires_at = 0.0
+
+
+# Attachment body: raw bytes, a binary file-like object (e.g. BytesIO) or a file path
+PdfSource = Union[bytes, bytearray, BinaryIO, str, os.PathLike]
+
+
 class ServiceNowPDFUploader:
-    def __init__(self, instance_url, access_token):
+    def __init__(self, instance_url, access_token=None, token_manager: Optional[ServiceNowTokenManager] = None):
+        """
+        With a token_manager, every request uses its current token, and a 401 response is retried
+        once with a refreshed token. Connections are pooled, so one instance is meant to be reused
+        (see get_servicenow_uploader).
+        """
         self.instance_url = instance_url.rstrip('/')
+        self.token_manager = token_manager
         self.access_token = access_token
-        self.session = requests.Session()
-        self.session.headers.update({
-            'Authorization': f'Bearer {access_token}',
-            'Accept': 'application/json'
-        })
+        self.session = _pooled_session()
+        self.session.headers.update({'Accept': 'application/json'})
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    def _current_token(self) -> Optional[str]:
+        return self.token_manager.get_token() if self.token_manager else self.access_token
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request with the current token; on 401, refreshes the token once and retries.
+        A file-like body is rewound to where it started before the retry.
+        """
+        headers = kwargs.pop("headers", {})
+        body = kwargs.get("data")
+        start = body.tell() if hasattr(body, "seek") else None
+        token = self._current_token()
+        kwargs.setdefault("timeout", SERVICENOW_TIMEOUT)
+        response = self.session.request(method, url, headers={**headers, "Authorization": f"Bearer {token}"}, **kwargs)
+        if response.status_code == 401 and self.token_manager is not None:
+            self.token_manager.invalidate(token)
+            token = self.token_manager.get_token()
+            if token:
+                print("ServiceNow token rejected, retrying with a refreshed token")
+                if start is not None:
+                    body.seek(start)
+                response = self.session.request(method, url, headers={**headers, "Authorization": f"Bearer {token}"},
+                                                **kwargs)
+        return response
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=SERVICENOW_POOL_CONNECTIONS,
+                                    max_keepalive_connections=SERVICENOW_POOL_CONNECTIONS),
+                timeout=httpx.Timeout(SERVICENOW_READ_TIMEOUT_SECONDS, connect=SERVICENOW_CONNECT_TIMEOUT_SECONDS),
+                headers={'Accept': 'application/json'},
+            )
+        return self._async_client
     
     def extract_sys_id_from_url(self, ui_url):
         """Extract sys_id from ServiceNow UI URL"""
@@ -55,12 +263,12 @@ class ServiceNowPDFUploader:
         }
 
         headers = {
-            "Authorization": f"Bearer {self.access_token}",
             "Accept": "application/json",
             "Content-Type": content_type
         }
 
-        response = self.session.post(
+        response = self._request(
+            "POST",
             url,
             params=params,
             headers=headers,
@@ -75,47 +283,75 @@ class ServiceNowPDFUploader:
             print(f"Response: {response.text}")
             return {"error": "feedback upload failed", "status_code": response.status_code}
 
-    def upload_pdf_to_incident(self, incident_sys_id, pdf_file_path, custom_filename=None):
-        """Upload PDF to incident using sys_id"""
-        if not os.path.exists(pdf_file_path):
-            raise FileNotFoundError(f"PDF file not found: {pdf_file_path}")
-        
-        # Determine filename
-        filename = custom_filename if custom_filename else os.path.basename(pdf_file_path)
-        
-        # Use the REST API endpoint (not the .do endpoint)
+    def _attachment_request(self, incident_sys_id: str, filename: str):
+        """URL, query parameters and headers of a PDF attachment upload (REST API, not the .do endpoint)."""
         url = f"{self.instance_url}/api/now/attachment/file"
-        
-        # Parameters for the attachment
         params = {
             'table_name': 'incident',
             'table_sys_id': incident_sys_id,
             'file_name': filename
         }
-        
-        # Headers
         headers = {
             'Content-Type': 'application/pdf',
-            'Accept': 'application/json',
-            'Authorization': f'Bearer {self.access_token}'
+            'Accept': 'application/json'
         }
-        
-        # Upload file
-        with open(pdf_file_path, 'rb') as pdf_file:
-            response = self.session.post(
-                url,
-                params=params,
-                headers=headers,
-                data=pdf_file.read()
-            )
-        
+        return url, params, headers
+
+    def upload_pdf_to_incident(self, incident_sys_id, pdf: PdfSource, custom_filename=None):
+        """
+        Upload PDF to incident using sys_id.
+        `pdf` is sent as-is: bytes directly, a file-like object (e.g. the BytesIO of generate_pdf_report)
+        streamed from its current position, which is restored afterwards, or a file path streamed from disk.
+        """
+        if isinstance(pdf, (str, os.PathLike)):
+            if not os.path.exists(pdf):
+                raise FileNotFoundError(f"PDF file not found: {pdf}")
+            with open(pdf, 'rb') as pdf_file:
+                return self.upload_pdf_to_incident(incident_sys_id, pdf_file,
+                                                   custom_filename or os.path.basename(pdf))
+
+        filename = custom_filename or "report.pdf"
+        url, params, headers = self._attachment_request(incident_sys_id, filename)
+        start = pdf.tell() if hasattr(pdf, "seek") else None
+        try:
+            response = self._request("POST", url, params=params, headers=headers, data=pdf)
+        finally:
+            if start is not None:
+                pdf.seek(start)
+        return self._upload_result(response, incident_sys_id, filename)
+
+    async def aupload_pdf_to_incident(self, incident_sys_id, pdf: Union[bytes, AsyncIterable[bytes]],
+                                      custom_filename="report.pdf"):
+        """
+        Async upload of a PDF given as bytes or as an async stream of chunks (e.g. an uploaded file),
+        sent as a streaming body without buffering or temp files. A streamed body can't be replayed,
+        so only bytes bodies are retried after a 401.
+        """
+        url, params, headers = self._attachment_request(incident_sys_id, custom_filename)
+        client = self._get_async_client()
+        token = await asyncio.to_thread(self._current_token)
+        response = await client.post(url, params=params, content=pdf,
+                                     headers={**headers, "Authorization": f"Bearer {token}"})
+        if response.status_code == 401 and self.token_manager is not None and isinstance(pdf, (bytes, bytearray)):
+            self.token_manager.invalidate(token)
+            token = await asyncio.to_thread(self.token_manager.get_token)
+            if token:
+                print("ServiceNow token rejected, retrying with a refreshed token")
+                response = await client.post(url, params=params, content=pdf,
+                                             headers={**headers, "Authorization": f"Bearer {token}"})
+        return self._upload_result(response, incident_sys_id, custom_filename, verify=False)
+
+    def _upload_result(self, response, incident_sys_id, filename, verify: bool = True):
+        """Maps an attachment upload response (requests or httpx) to the result returned to routes."""
         if response.status_code == 201:
             print(f"✓ Successfully uploaded {filename} to incident")
             return response.json()
         elif response.status_code == 404:
             print(f"✗ Incident with sys_id {incident_sys_id} not found")
+            incident_cache.invalidate_sys_id(incident_sys_id)
             # Try to get incident details
-            self.verify_incident_exists(incident_sys_id)
+            if verify:
+                self.verify_incident_exists(incident_sys_id)
             return {"error" : "incident not found."}
         elif response.status_code == 401:
             print("✗ Authentication failed. Check your access token.")
@@ -131,7 +367,7 @@ class ServiceNowPDFUploader:
         """Verify if incident exists and get its details"""
         url = f"{self.instance_url}/api/now/table/incident/{sys_id}"
         
-        response = self.session.get(url)
+        response = self._request("GET", url)
         
         if response.status_code == 200:
             data = response.json()
@@ -161,31 +397,104 @@ class ServiceNowPDFUploader:
         return self.upload_pdf_to_incident(sys_id, pdf_file_path, custom_filename)
 
 
-def get_incident_sys_id(instance_url: str, token: str, inc_number: str) -> str:
+class IncidentLookupError(Exception):
+    """The incident lookup failed (HTTP error, timeout, ...) - unlike a None result, says nothing about the incident."""
+
+
+def lookup_incident_sys_id(instance_url: str, token: str, inc_number: str) -> Optional[str]:
     """
-    Query ServiceNow to get sys_id for given INC number
+    Query ServiceNow to get sys_id for given INC number (served from incident_cache when known).
+    Returns None only when ServiceNow answered that the incident does not exist; raises
+    IncidentLookupError when the lookup itself failed.
     """
+    cached, sys_id = incident_cache.get(inc_number)
+    if cached:
+        return sys_id
+
     url = f"{instance_url}/api/now/table/incident"
     headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
     params = {"number": inc_number}
 
     try:
-        resp = requests.get(url, headers=headers, params=params)
-        if resp.status_code == 200:
-            result = resp.json().get("result", [])
-            if result and len(result) > 0:
-                return result[0]["sys_id"]
-        print(f"Failed to get sys_id for {inc_number}: {resp.text}")
-        return None
+        resp = http_session.get(url, headers=headers, params=params, timeout=SERVICENOW_TIMEOUT)
     except Exception as e:
-        print(f"Error fetching sys_id: {e}")
+        raise IncidentLookupError(f"Error fetching sys_id for {inc_number}: {e}") from e
+    if resp.status_code != 200:
+        if resp.status_code == 401:
+            servicenow_token_manager.invalidate(token)
+        raise IncidentLookupError(f"Failed to get sys_id for {inc_number} ({resp.status_code}): {resp.text}")
+    try:
+        result = resp.json().get("result", [])
+        sys_id = result[0]["sys_id"] if result else None
+    except (ValueError, KeyError, AttributeError) as e:
+        raise IncidentLookupError(f"Unexpected response for {inc_number}: {e}") from e
+    incident_cache.set(inc_number, sys_id)
+    return sys_id
+
+
+def get_incident_sys_id(instance_url: str, token: str, inc_number: str) -> str:
+    """
+    Query ServiceNow to get sys_id for given INC number (served from incident_cache when known).
+    Returns None when the incident does not exist or the lookup failed.
+    """
+    try:
+        sys_id = lookup_incident_sys_id(instance_url, token, inc_number)
+    except IncidentLookupError as e:
+        print(e)
         return None
+    if not sys_id:
+        print(f"Incident {inc_number} not found")
+    return sys_id
 
 
-def get_servicenow_access_token():
+# Incident numbers per table query (keeps the numberIN filter well within URL limits)
+INCIDENT_LOOKUP_BATCH_SIZE = 100
+
+
+def get_incident_sys_ids(instance_url: str, token: str, inc_numbers: List[str]) -> Dict[str, Optional[str]]:
     """
-    Get ServiceNow OAuth access token
-    Returns: access token string or None if failed
+    Resolves many INC numbers with one table query per INCIDENT_LOOKUP_BATCH_SIZE numbers (numberIN filter).
+    Returns {inc_number: sys_id}, with None for numbers that don't exist. Numbers whose query failed are left out.
+    Numbers known to incident_cache are not queried.
+    """
+    url = f"{instance_url}/api/now/table/incident"
+    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+    sys_ids = {}
+    numbers = []
+    for number in dict.fromkeys(inc_numbers):
+        cached, sys_id = incident_cache.get(number)
+        if cached:
+            sys_ids[number] = sys_id
+        else:
+            numbers.append(number)
+
+    for start in range(0, len(numbers), INCIDENT_LOOKUP_BATCH_SIZE):
+        batch = numbers[start:start + INCIDENT_LOOKUP_BATCH_SIZE]
+        params = {
+            "sysparm_query": "numberIN" + ",".join(batch),
+            "sysparm_fields": "number,sys_id",
+            "sysparm_limit": len(batch),
+        }
+        try:
+            resp = http_session.get(url, headers=headers, params=params, timeout=SERVICENOW_TIMEOUT)
+            if resp.status_code != 200:
+                if resp.status_code == 401:
+                    servicenow_token_manager.invalidate(token)
+                print(f"Failed to resolve incidents {batch}: {resp.text}")
+                continue
+            found = {row["number"]: row["sys_id"] for row in resp.json().get("result", [])}
+            for number in batch:
+                sys_ids[number] = found.get(number)
+                incident_cache.set(number, found.get(number))
+        except Exception as e:
+            print(f"Error resolving incidents: {e}")
+    return sys_ids
+
+
+def request_servicenow_token() -> Optional[dict]:
+    """
+    Requests a new ServiceNow OAuth access token (password grant).
+    Returns: the token response (access_token, expires_in, ...) or None if failed
     """
     url = "https://franciscanalliancepoc.service-now.com/oauth_token.do"
     
@@ -203,11 +512,10 @@ def get_servicenow_access_token():
     }
     
     try:
-        response = requests.post(url, headers=headers, data=payload)
+        response = http_session.post(url, headers=headers, data=payload, timeout=SERVICENOW_TIMEOUT)
         
         if response.status_code == 200:
-            response_json = response.json()
-            return response_json.get("access_token")
+            return response.json()
         else:
             print(f"Error: {response.status_code}")
             print(f"Response: {response.text}")
@@ -216,4 +524,34 @@ def get_servicenow_access_token():
     except Exception as e:
         print(f"Error: {e}")
         return None
-     
\ No newline at end of file
+
+
+servicenow_token_manager = ServiceNowTokenManager(request_servicenow_token)
+
+
+def get_servicenow_access_token():
+    """
+    Get ServiceNow OAuth access token (cached process-wide, refreshed before it expires)
+    Returns: access token string or None if failed
+    """
+    return servicenow_token_manager.get_token()
+
+
+_uploader: Optional[ServiceNowPDFUploader] = None
+_uploader_lock = threading.Lock()
+
+
+def get_servicenow_uploader() -> Optional[ServiceNowPDFUploader]:
+    """
+    The process-wide uploader (pooled connections, tokens from servicenow_token_manager),
+    or None when SERVICENOW_INSTANCE_URL is not configured.
+    """
+    global _uploader
+    instance_url = os.getenv("SERVICENOW_INSTANCE_URL")
+    if not instance_url:
+        return None
+    if _uploader is None:
+        with _uploader_lock:
+            if _uploader is None:
+                _uploader = ServiceNowPDFUploader(instance_url, token_manager=servicenow_token_manager)
+    return _uploader
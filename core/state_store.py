@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from core.disk_cache import DiskCache
+from core.models import State
+
+# Processed call state shared by every worker: "disk" (SQLite file on the host) or "sql" (ProcessedCallState table)
+CALL_STATE_BACKEND = os.getenv("CALL_STATE_BACKEND", "disk").lower()
+CALL_STATE_MEMORY_MB = float(os.getenv("CALL_STATE_MEMORY_MB", "64"))
+CALL_STATE_DISK_MAX_MB = int(os.getenv("CALL_STATE_DISK_MAX_MB", "2048"))
+
+
+def serialize_state(state: State) -> bytes:
+    return zlib.compress(json.dumps(state, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+def deserialize_state(blob: bytes) -> State:
+    return json.loads(zlib.decompress(blob))
+
+
+class SqlCallStateBackend:
+    def get(self, filename: str) -> Optional[State]:
+        from dbs.call_state import get_call_state
+        blob = get_call_state(filename)
+        return deserialize_state(blob) if blob else None
+
+    def set(self, filename: str, state: State):
+        from dbs.call_state import upsert_call_state
+        return upsert_call_state(filename, serialize_state(state))
+
+    def version(self, filename: str):
+        from dbs.call_state import get_call_state_version
+        return get_call_state_version(filename)
+
+
+class CallStateStore:
+    """
+    Two-tier store for the State of processed calls, keyed by audio filename.
+    An in-process LRU of compressed states, capped at max_memory_bytes, sits in front of a
+    persistent backend shared by all workers, so follow-up requests (report, graph, INC check)
+    work on any worker and after restarts.
+    Every memory entry remembers the backend version (write time) it was read or written as, and a
+    memory hit is only served once the backend confirms that version is still current, so a state
+    re-processed or updated by another worker is never served stale.
+    """
+
+    def __init__(self, backend, max_memory_bytes: int):
+        self.backend = backend
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: "OrderedDict[str, Tuple[bytes, Any]]" = OrderedDict() # filename -> (blob, backend version)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "stale_memory_hits": 0, "backend_hits": 0, "misses": 0, "evictions": 0,
+                          "backend_errors": 0}
+
+    def _remember(self, filename: str, blob: bytes, version):
+        """Caller holds the lock."""
+        previous = self._memory.pop(filename, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous[0])
+        self._memory[filename] = (blob, version)
+        self._memory_bytes += len(blob)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counters["evictions"] += 1
+
+    def put(self, filename: str, state: State):
+        blob = serialize_state(state)
+        try:
+            version = self.backend.set(filename, state)
+        except Exception as e:
+            print(f"Failed to persist state of {filename}: {e}")
+            version = None
+            with self._lock:
+                self._counters["backend_errors"] += 1
+        with self._lock:
+            self._remember(filename, blob, version)
+
+    def _backend_version(self, filename: str):
+        try:
+            return self.backend.version(filename)
+        except Exception as e:
+            print(f"Failed to check state version of {filename}: {e}")
+            with self._lock:
+                self._counters["backend_errors"] += 1
+            return None
+
+    def get(self, filename: str) -> Optional[State]:
+        with self._lock:
+            entry = self._memory.get(filename)
+        if entry is not None:
+            blob, version = entry
+            current = self._backend_version(filename)
+            # None: the backend can't tell (unreachable, evicted or never persisted) - the copy here is the best we have
+            if current is None or current == version:
+                with self._lock:
+                    if filename in self._memory:
+                        self._memory.move_to_end(filename)
+                    self._counters["memory_hits"] += 1
+                return deserialize_state(blob)
+            with self._lock:
+                self._counters["stale_memory_hits"] += 1
+
+        # Version first: a write landing between the two reads then only makes the next get reload again
+        version = self._backend_version(filename)
+        try:
+            state = self.backend.get(filename)
+        except Exception as e:
+            print(f"Failed to load state of {filename}: {e}")
+            state = None
+            with self._lock:
+                self._counters["backend_errors"] += 1
+        with self._lock:
+            if state is None:
+                self._counters["misses"] += 1
+            else:
+                self._counters["backend_hits"] += 1
+                self._remember(filename, serialize_state(state), version)
+        return state
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "backend": CALL_STATE_BACKEND,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+            }
+
+
+if CALL_STATE_BACKEND == "sql":
+    _backend = SqlCallStateBackend()
+else:
+    _backend = DiskCache("call_states", max_bytes=CALL_STATE_DISK_MAX_MB * 1024 * 1024)
+
+call_state_store = CallStateStore(_backend, int(CALL_STATE_MEMORY_MB * 1024 * 1024))
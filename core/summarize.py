@@ -0,0 +1,150 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from langchain.prompts import ChatPromptTemplate
+from core.llm_cache import cached_invoke
+
+# Transcripts longer than this (characters) are summarized map-reduce style
+SUMMARY_MAP_REDUCE_MIN_CHARS = int(os.getenv("SUMMARY_MAP_REDUCE_MIN_CHARS", "24000"))
+# Target size of one map chunk (characters), cut on segment boundaries
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "12000"))
+SUMMARY_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", "4"))
+
+SUMMARIZE_PROMPT_VERSION = "summarize-v2"
+SUMMARIZE_MAP_PROMPT_VERSION = "summarize-map-v1"
+SUMMARIZE_REDUCE_PROMPT_VERSION = "summarize-reduce-v1"
+
+SUMMARY_FIELDS = '''
+- "summary": A concise summary of the call, capturing all key points discussed.
+- "sentiment": An aspect-based sentiment analysis narrative that integrates tone and emotional indicators, including but not limited to frustration, calmness, or enthusiasm. This should encompass both explicit language cues and contextual interpretations.
+- "sentiment_score": A numeric integer overall sentiment score (1-10) that reflects the cumulative sentiment of the call, factoring in words used, tone, and emotional nuances.
+- "call_purpose": The main objective of the call, derived from the discussion.
+- "speaker_insights": A dictionary with two keys, "Customer" and "Agent". Each key should have a descriptive string insight that captures not only what was spoken, but also the inferred emotional state (e.g., customer tone, frustration, annoyance; agent's tone, empathy, professionalism) observed during the call. Use both direct content and overall call dynamics to inform your insights.
+- "Agent_rating": Based upon the conversation and speaker insights, rate the performance of Agent out of 10, for example if he talks nicely, behave properly give him rating 8-10,if his tone was not appropriate, he didnt show empathy to the customer in such scenarios give him ratings below 4. Use your intelligence to observe agent performance and rate him out of 10."
+- "Customer_name": Based upon the conversation fetch Customer Name. if Customer name is not mentioned then return NA."
+- "Agent_name": Based upon the conversation fetch Agent Name. if Agent name is not mentioned then return NA."
+- "action_items": A list of follow-up action items that has been discussed during the call, that need to undertaken by the Agent in the future in following format:
+  [{{"task"}}: "<description>"]
+'''
+
+
+# Prompt for summarization (the transcription is only sent once, in the human message)
+def get_summarize_text_prompt() -> ChatPromptTemplate:
+    systemContent = '''
+You are an assistant that generates concise, insightful, and professional call summaries in JSON format. Your task is to analyze the provided transcription and extract key details with a specific focus on capturing not only the literal words but also the underlying tone, emotional nuances, and customer sentiment such as frustration, annoyance, and any other subtle emotional indicators. Ensure that your analysis is based on both the textual content and the overall call context.
+
+The JSON output must include the following fields without any change in their format:
+''' + SUMMARY_FIELDS + '''
+The transcription is provided in the next message.
+
+Return the response in JSON format only, without any extra text.
+'''
+    messages = [("system", systemContent), ("human", "{transcription}")]
+    return ChatPromptTemplate.from_messages(messages)
+
+
+def get_summarize_chunk_prompt() -> ChatPromptTemplate:
+    systemContent = '''
+You are an assistant that summarizes one part of a longer call transcription in JSON format. Capture the key points, tone and emotional cues of this part only; another step will merge the parts.
+
+The JSON output must include the following fields, describing this part of the call:
+''' + SUMMARY_FIELDS + '''
+Return the response in JSON format only, without any extra text.
+'''
+    messages = [("system", systemContent), ("human", "Part {part} of {total}:\n{transcription}")]
+    return ChatPromptTemplate.from_messages(messages)
+
+
+def get_merge_summaries_prompt() -> ChatPromptTemplate:
+    systemContent = '''
+You are an assistant that merges JSON summaries of consecutive parts of one call into a single call summary in JSON format.
+- Combine the part summaries into one concise summary of the whole call, in chronological order.
+- "sentiment_score" and "Agent_rating" must reflect the call as a whole, not an average of isolated parts; weigh how the call evolved and ended.
+- Merge "speaker_insights" per speaker and de-duplicate "action_items".
+- Take "Customer_name" and "Agent_name" from any part that mentions them; return NA only if no part does.
+
+The JSON output must include the following fields without any change in their format:
+''' + SUMMARY_FIELDS + '''
+Return the response in JSON format only, without any extra text.
+'''
+    messages = [("system", systemContent), ("human", "Part summaries in call order:\n{summaries}")]
+    return ChatPromptTemplate.from_messages(messages)
+
+
+# JSON cleaning utility
+def clean_and_parse_json(response_text: str) -> Optional[dict]:
+    try:
+        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group(0))
+        return None
+    except json.JSONDecodeError:
+        return None
+
+
+def is_json_object(response_text: str) -> bool:
+    return clean_and_parse_json(response_text) is not None
+
+
+def chunk_segments(segment_texts: List[str], max_chars: int = SUMMARY_CHUNK_CHARS) -> List[str]:
+    """Joins consecutive segment texts into chunks of at most ~max_chars, never splitting a segment."""
+    chunks, current, size = [], [], 0
+    for text in segment_texts:
+        text = text.strip()
+        if current and size + len(text) > max_chars:
+            chunks.append(" ".join(current))
+            current, size = [], 0
+        current.append(text)
+        size += len(text) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def _summarize_chunk(llm, chunk: str, part: int, total: int) -> Optional[dict]:
+    try:
+        response = cached_invoke(get_summarize_chunk_prompt(), llm,
+                                 {"transcription": chunk, "part": part, "total": total},
+                                 SUMMARIZE_MAP_PROMPT_VERSION, is_valid=is_json_object)
+    except Exception as e:
+        print(f"Summarizing part {part}/{total} failed: {e}")
+        return None
+    return clean_and_parse_json(response)
+
+
+def summarize_transcript(transcription: str, segment_texts: List[str], llm) -> Optional[dict]:
+    """
+    Returns the parsed summary JSON of a call, or None when the model response can't be parsed.
+    Transcripts above SUMMARY_MAP_REDUCE_MIN_CHARS are chunked along segment boundaries,
+    the chunks summarized in parallel, and the partial summaries merged into the same schema.
+    A chunk that still fails after one retry makes the result None rather than a partial summary.
+    """
+    transcription = transcription or ""
+    chunks = chunk_segments(segment_texts) if len(transcription) > SUMMARY_MAP_REDUCE_MIN_CHARS else []
+
+    if len(chunks) <= 1:
+        response = cached_invoke(get_summarize_text_prompt(), llm, {"transcription": transcription},
+                                 SUMMARIZE_PROMPT_VERSION, is_valid=is_json_object)
+        return clean_and_parse_json(response)
+
+    total = len(chunks)
+    with ThreadPoolExecutor(max_workers=SUMMARY_MAX_WORKERS) as executor:
+        partials = list(executor.map(lambda item: _summarize_chunk(llm, item[1], item[0], total), enumerate(chunks, 1)))
+        # Failed parts get one more try (invalid responses aren't cached, so the retry asks the model again)
+        failed = [part for part, partial in enumerate(partials, 1) if partial is None]
+        for part, partial in zip(failed, executor.map(lambda part: _summarize_chunk(llm, chunks[part - 1], part, total), failed)):
+            partials[part - 1] = partial
+
+    missing = [part for part, partial in enumerate(partials, 1) if partial is None]
+    if missing:
+        # A summary built from some of the parts would pass for the whole call's (ratings, action items...)
+        print(f"Summarizing parts {missing} of {total} failed, no summary for the call")
+        return None
+
+    summaries = [f"Part {part}: {json.dumps(partial, ensure_ascii=False)}" for part, partial in enumerate(partials, 1)]
+
+    response = cached_invoke(get_merge_summaries_prompt(), llm, {"summaries": "\n".join(summaries)},
+                             SUMMARIZE_REDUCE_PROMPT_VERSION, is_valid=is_json_object)
+    return clean_and_parse_json(response)
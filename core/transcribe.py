@@ -1,6 +1,9 @@
 
 from core.llm import client
 from langchain_core.prompts import ChatPromptTemplate
+from core.llm_cache import acached_invoke
+
+AUTO_CORRECT_PROMPT_VERSION = "auto-correct-v1"
 
 async def auto_correct_text(text: str) -> str:
     """
@@ -27,10 +30,7 @@ async def auto_correct_text(text: str) -> str:
     )
 
 
-    chain = prompt | client
-
-    response = chain.invoke({"question": text})
-    return response.content    
+    return await acached_invoke(prompt, client, {"question": text}, AUTO_CORRECT_PROMPT_VERSION)
     
 
     
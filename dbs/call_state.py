@@ -0,0 +1,51 @@
+from dbs.db_connections import get_db_connection
+
+# Expected table:
+#   ProcessedCallState (AudioFileName NVARCHAR(450) PRIMARY KEY, State VARBINARY(MAX),
+#                       UpdatedAt DATETIME2 DEFAULT SYSUTCDATETIME())
+
+
+def get_call_state(audiofilename: str):
+    """Returns the serialized state of a processed call, or None."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT State FROM ProcessedCallState WHERE AudioFileName = ?", (audiofilename,))
+    row = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return bytes(row[0]) if row else None
+
+
+def get_call_state_version(audiofilename: str):
+    """Returns the UpdatedAt of a processed call's state (without the state itself), or None."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT UpdatedAt FROM ProcessedCallState WHERE AudioFileName = ?", (audiofilename,))
+    row = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return row[0] if row else None
+
+
+def upsert_call_state(audiofilename: str, state: bytes):
+    """Stores the serialized state and returns its new UpdatedAt."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    upsert_query = """
+    MERGE ProcessedCallState AS target
+    USING (SELECT ? AS AudioFileName, ? AS State) AS source
+    ON target.AudioFileName = source.AudioFileName
+    WHEN MATCHED THEN
+        UPDATE SET State = source.State, UpdatedAt = SYSUTCDATETIME()
+    WHEN NOT MATCHED THEN
+        INSERT (AudioFileName, State) VALUES (source.AudioFileName, source.State)
+    OUTPUT inserted.UpdatedAt;
+    """
+    cursor.execute(upsert_query, (audiofilename, state))
+    updated_at = cursor.fetchone()[0]
+    conn.commit()
+
+    cursor.close()
+    conn.close()
+    return updated_at
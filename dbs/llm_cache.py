@@ -0,0 +1,79 @@
+from dbs.db_connections import get_db_connection
+
+# Expected table:
+#   LLMResponseCache (CacheKey CHAR(64) PRIMARY KEY, Response NVARCHAR(MAX),
+#                     CreatedAt DATETIME2 DEFAULT SYSUTCDATETIME(), LastAccess DATETIME2 DEFAULT SYSUTCDATETIME())
+
+
+def get_llm_cache_entry(cache_key: str, ttl_seconds: int):
+    """Returns the cached response (and refreshes LastAccess), or None when missing/expired."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "SELECT Response FROM LLMResponseCache WHERE CacheKey = ? AND CreatedAt > DATEADD(second, -?, SYSUTCDATETIME())",
+        (cache_key, ttl_seconds)
+    )
+    row = cursor.fetchone()
+    if row:
+        cursor.execute("UPDATE LLMResponseCache SET LastAccess = SYSUTCDATETIME() WHERE CacheKey = ?", (cache_key,))
+        conn.commit()
+
+    cursor.close()
+    conn.close()
+    return row[0] if row else None
+
+
+def upsert_llm_cache_entry(cache_key: str, response: str):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    upsert_query = """
+    MERGE LLMResponseCache AS target
+    USING (SELECT ? AS CacheKey, ? AS Response) AS source
+    ON target.CacheKey = source.CacheKey
+    WHEN MATCHED THEN
+        UPDATE SET Response = source.Response, CreatedAt = SYSUTCDATETIME(), LastAccess = SYSUTCDATETIME()
+    WHEN NOT MATCHED THEN
+        INSERT (CacheKey, Response) VALUES (source.CacheKey, source.Response);
+    """
+    cursor.execute(upsert_query, (cache_key, response))
+    conn.commit()
+
+    cursor.close()
+    conn.close()
+
+
+def evict_llm_cache_entries(ttl_seconds: int, max_entries: int) -> int:
+    """Deletes expired entries, then the least recently used ones above max_entries. Returns rows deleted."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "DELETE FROM LLMResponseCache WHERE CreatedAt <= DATEADD(second, -?, SYSUTCDATETIME())",
+        (ttl_seconds,)
+    )
+    deleted = cursor.rowcount
+    cursor.execute("""
+        WITH Ranked AS (
+            SELECT CacheKey, ROW_NUMBER() OVER (ORDER BY LastAccess DESC) AS rn
+            FROM LLMResponseCache
+        )
+        DELETE FROM Ranked WHERE rn > ?
+    """, (max_entries,))
+    deleted += cursor.rowcount
+    conn.commit()
+
+    cursor.close()
+    conn.close()
+    return deleted
+
+
+def count_llm_cache_entries() -> int:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM LLMResponseCache")
+    count = cursor.fetchone()[0]
+    cursor.close()
+    conn.close()
+    return count
@@ -134,3 +134,22 @@ def get_agent_statistics(start_datetime=None, end_datetime=None):
     cursor.close()
     conn.close()
     return stats
+
+
+def get_audio_filenames_by_date(start_datetime, end_datetime) -> list[str]:
+    """
+    Returns the audio filenames of the calls recorded in the Statistic table between
+    start_datetime and end_datetime (CreatedAt), oldest first.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "SELECT AudioFileName FROM Statistic WHERE CreatedAt BETWEEN ? AND ? ORDER BY CreatedAt",
+        (start_datetime, end_datetime),
+    )
+    rows = cursor.fetchall()
+
+    cursor.close()
+    conn.close()
+    return [row[0] for row in rows]
@@ -5,6 +5,9 @@ from dotenv import load_dotenv
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 from api.routes import api_router
+from core.report import warm_pipelines
+from core.report_outbox import start_outbox_worker
+from core.jobs import start_job_heartbeat
 
 try:
     from pydub import AudioSegment
@@ -53,6 +56,17 @@ app.add_middleware(CORSFallbackMiddleware)
 app.include_router(api_router)
 
 
+@app.on_event("startup")
+def warm_up():
+    # Compile every pipeline variant once per worker instead of per request
+    if os.getenv("PIPELINE_WARMUP", "true").lower() == "true":
+        warm_pipelines()
+    # Deliver report uploads still queued from before a restart
+    start_outbox_worker()
+    # Keep this worker's job leases alive and pick up jobs interrupted by a restart of their worker
+    start_job_heartbeat()
+
+
 
 
 
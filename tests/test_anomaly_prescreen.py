@@ -0,0 +1,46 @@
+"""
+The local pre-screen must send every request for card data or identity details to the LLM review
+("suspicious"), while only sensitive numbers actually spoken count as anomalies on their own.
+"""
+import pytest
+
+from core.anomaly_prescreen import prescreen_anomalies
+
+PII_REQUESTS = [
+    "Can I get your credit card number please?",
+    "Please read me the sixteen digits on your debit card.",
+    "And the three digits on the back of your card?",
+    "What is the expiration date on the card?",
+    "Could you confirm your date of birth for me?",
+    "Just read me the last four of your social.",
+    "What's the CVV?",
+    "I will need your one time password to continue.",
+]
+
+BENIGN = [
+    "Thanks for calling, how can I help you today?",
+    "Your package will arrive on Tuesday between 9 and 5.",
+]
+
+
+@pytest.mark.parametrize("text", PII_REQUESTS)
+def test_pii_requests_are_escalated(text):
+    result = prescreen_anomalies(text)
+    assert result["suspicious"]
+    assert not result["isAnomaly"]
+
+
+@pytest.mark.parametrize("text", BENIGN)
+def test_benign_text_is_not_escalated(text):
+    assert prescreen_anomalies(text) == {"isAnomaly": False, "anomalyCount": 0, "reasons": [], "suspicious": False}
+
+
+@pytest.mark.parametrize("text, reason", [
+    ("Sure, it's 4111 1111 1111 1111.", "Card number disclosed"),
+    ("My social is 123-45-6789.", "Social security number disclosed"),
+    ("The code is 4 8 1 5 2 2.", "CVV/PIN/OTP disclosed"),
+])
+def test_disclosures_are_anomalies(text, reason):
+    result = prescreen_anomalies(text)
+    assert result["isAnomaly"] and result["suspicious"]
+    assert result["reasons"] == [reason]
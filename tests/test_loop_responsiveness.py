@@ -0,0 +1,83 @@
+"""
+The event loop stays responsive while many LLM calls are in flight: the async LLM layer must
+await the client, never block the loop. The Azure clients are replaced by stubs that take
+LLM_CALL_SECONDS (awaiting asyncio.sleep), and a ticker coroutine measures how late the loop wakes it.
+A blocking call anywhere on the path would show up as a lag about as long as the call itself.
+"""
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+
+os.environ["LLM_CACHE_BACKEND"] = "off"
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+os.environ.setdefault("AZURE_OPENAI_KEY", "test-key")
+
+import core.anomaly_detection as anomaly_detection
+import core.transcribe as transcribe
+
+CONCURRENCY = 20
+LLM_CALL_SECONDS = 0.2
+TICK_SECONDS = 0.01
+MAX_LOOP_LAG_SECONDS = 0.05
+
+
+class StubAsyncOpenAI:
+    """Stands in for AsyncAzureOpenAI: beta.chat.completions.parse awaits like a network call."""
+
+    def __init__(self):
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=self.parse)))
+
+    async def parse(self, **kwargs):
+        await asyncio.sleep(LLM_CALL_SECONDS)
+        content = json.dumps({"isAnomaly": False, "anomalyCount": 0, "reasons": []})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+class StubChatModel:
+    """Stands in for the LangChain chat client: ainvoke awaits like a network call."""
+    deployment_name = "stub"
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(LLM_CALL_SECONDS)
+        return SimpleNamespace(content=messages[-1].content, usage_metadata=None)
+
+
+async def ticker(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+
+async def run_calls() -> tuple:
+    stop, lags = asyncio.Event(), []
+    tick = asyncio.create_task(ticker(stop, lags))
+    await asyncio.sleep(TICK_SECONDS)
+
+    started = time.perf_counter()
+    calls = []
+    for i in range(CONCURRENCY):
+        text = f"Can you confirm the card number on file so we can process the refund? (call {i})"
+        calls.append(anomaly_detection.anomaly_detection_sementic(text) if i % 2 == 0 else transcribe.auto_correct_text(text))
+    results = await asyncio.gather(*calls)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await tick
+    return results, elapsed, lags
+
+
+def test_event_loop_stays_responsive_under_llm_load(monkeypatch):
+    monkeypatch.setattr(anomaly_detection, "get_async_openai_client", StubAsyncOpenAI)
+    monkeypatch.setattr(transcribe, "client", StubChatModel())
+
+    results, elapsed, lags = asyncio.run(run_calls())
+
+    assert len(results) == CONCURRENCY
+    assert results[0] == {"isAnomaly": False, "anomalyCount": 0, "reasons": []}
+    # The calls overlapped instead of running one after the other
+    assert elapsed < CONCURRENCY * LLM_CALL_SECONDS / 2
+    assert len(lags) >= elapsed / TICK_SECONDS / 2
+    assert max(lags) < MAX_LOOP_LAG_SECONDS, f"event loop blocked for {max(lags) * 1000:.0f} ms"